@@ -1,6 +1,6 @@
 """
-This program applies the changes that are logged when using the Lokisa Spell program. Output files are generated into a pre-created folder named changed_log_files. The generated textgrids with changed text is placed into a similar folder structure to where it is sorced from.
-Two folders are automatically generated, one where all the globally changed files go and one where singular file by file changes go.
+This program applies the changes that are logged when using the Lokisa Spell program. Output files are generated into a folder named changed_textgrid_files. The generated textgrids with changed text is placed into a similar folder structure to where it is sorced from.
+The single occurrence changes and the global changes are applied together, so every changed file is written once.
 """
 
 __author__ = "Umr Barends"
@@ -8,157 +8,670 @@ __affiliation__ = "Stellenbosch University"
 __date__ = "2021-02-23"
 
 import os, re
-from fileinput import FileInput
-from tabCompleter import *
+import argparse
+import bisect
+import concurrent.futures
+import datetime
+import glob
+import itertools
+import json
+import textgrid_reader
+import change_journal
+from worker_chunks import split_into_chunks
+from atomic_write import write_file_atomically
+
+def compose_global_changes(global_changes):
+    """Combines the logged global changes into one replacement map.
+
+    The changes are applied one after the other in the order of the log, so a
+    change from "a" to "b" followed by a change from "b" to "c" turns "a" into
+    "c". The map gives the end result of the whole chain for every word. A later
+    change of the same word supersedes an earlier one, since every decision was
+    made on the original transcriptions.
 
-def parse_change_log(log_dir):
-    """Find all lines that contain changes to be made in log file and return these lines as a list of strings.
+    Parameters
+    ----------
+
+    global_changes : list
+        a list of (search_word, correction) tuples in the order they were logged
+
+    Returns
+    -------
+
+    dict
+        a dictionary mapping every word to be changed to its final correction
+    """
+
+    replacements = {}
+    for search_word, correction in global_changes:
+        for word, word_correction in replacements.items():
+            if word_correction == search_word:
+                replacements[word] = correction
+        replacements[search_word] = correction
+
+    return {word: correction for word, correction in replacements.items() if word != correction}
+
+def get_replacement_regex(replacements):
+    """Compiles a regular expression that matches any of the words in the replacement map.
+
+    Words only match as a whole, i.e. when they are delimited by white space or by the
+    start or end of the text, in the same way that Lokisa splits the text into words.
 
     Parameters
     ----------
-    log_dir : str
-        The path of the directory to the log file to be parsed
+
+    replacements : dict
+        a dictionary mapping words to their corrections
 
     Returns
     -------
 
-    list
-        a list of strings that contain the changes to be made to the 
-        original transcript/textgrid file.
+    re.Pattern
+        the compiled regular expression
+    """
+
+    # Longer words first, so that the alternation never stops at a shorter word.
+    words = sorted(replacements, key=lambda word: (-len(word), word))
+    return re.compile(r'(?<!\S)(?:' + '|'.join(re.escape(word) for word in words) + r')(?!\S)')
+
+def splice_marks(text, items, changed_marks):
+    """Writes changed marks back into the decoded text of a TextGrid.
+
+    Parameters
+    ----------
+
+    text : str
+        the decoded text of the TextGrid file
+    items : list
+        the TierItem tuples of the tier, from textgrid_reader.read_tier_items
+    changed_marks : dict
+        a dictionary mapping the index of an item to its new mark
+
+    Returns
+    -------
+
+    str
+        the changed text
     """
-    try:
-        with open(log_dir) as f:
-            log = [line for line in f]
-        substring   = ":Change"
-        substring2  = ":Globally"
-        lines       = []
-        cnt         = 0
 
-        for line in log:
-            if line.find(substring) != -1 or line.find(substring2) != -1:
-                lines.append(line)
-                cnt +=1
+    pieces = []
+    pos = 0
+    for item_idx in sorted(changed_marks):
+        item = items[item_idx]
+        pieces.append(text[pos:item.start])
+        pieces.append(changed_marks[item_idx].replace('"', '""'))
+        pos = item.end
+    pieces.append(text[pos:])
 
-        print(str(cnt) + " changes to be made found!\n")
-        return lines
+    return "".join(pieces)
 
-    except FileNotFoundError as error:
-        print(error)
-        print("Check if log file directory is typed correctly and if the file exists")
-        return ''
+def map_in_chunks(func, items, jobs=1, *args):
+    """Calls func(chunk, *args) on chunks of the items and returns the concatenated results.
 
-def decode_log_string(log_string):
-    """Decodes the changes that must be made from the log file
+    With jobs > 1 the chunks are handled by a pool of worker processes. The
+    results keep the order of the items.
 
     Parameters
     ----------
 
-    log_string : str
-        string that is to be decoded from the log file
+    func : function
+        a module level function that takes a list of items and returns a list of results
+    items : list
+        the items to process
+    jobs : int
+        the number of worker processes to use
+
+    Returns
+    -------
+
+    list
+        the results of all the items
+    """
+
+    if jobs > 1 and len(items) > 1:
+        chunks = split_into_chunks(items, jobs)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            chunk_results = executor.map(func, chunks, *[itertools.repeat(arg) for arg in args])
+            return [result for results in chunk_results for result in results]
+
+    return func(items, *args)
+
+def find_instance(mark, search_word, instance):
+    """Finds a given instance of a word in a mark.
+
+    Parameters
+    ----------
+
+    mark : str
+        the text of an interval
+    search_word : str
+        the word to find
+    instance : int
+        which occurrence of the word in the mark to find, counting from 1
 
     Returns
     -------
 
     tuple
-        a tuple containing tokens required to change the textgrid file
+        the (start, end) span of the word in the mark, or None if the mark has
+        fewer instances of the word
+    """
+
+    cnt = 0
+    for match in re.finditer(r'\S+', mark):
+        if match.group(0) == search_word:
+            cnt += 1
+            if cnt == instance:
+                return match.span()
+
+    return None
+
+def write_manifest(manifest_fn, log_files, records):
+    """Writes a JSON summary of the files that were written.
+
+    Parameters
+    ----------
+
+    manifest_fn : str
+        the path of the manifest file
+    log_files : list
+        the paths of the log files or journals the changes came from
+    records : list
+        the manifest entries of the written files
     """
 
-    print(log_string)
-    log_string_tokens   = log_string.split(" ")
-    if log_string_tokens[1].find(':Globally') != -1:
-        search_word     = log_string_tokens[3]
-        correction      = log_string_tokens[5]
-        return search_word, correction, "Global"
-    else:
-        search_word = log_string_tokens[2]
-        textgrid_dir = log_string_tokens[5]
-        interval = log_string_tokens[7]
-        correction = log_string_tokens[11].rstrip()
-        return search_word, textgrid_dir, interval, correction
+    manifest = {
+        "log_files": log_files,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "num_files": len(records),
+        "num_changes": sum(record["changes"] for record in records),
+        "files": records,
+    }
+    write_file_atomically(manifest_fn, (json.dumps(manifest, indent=2, ensure_ascii=False) + "\n").encode("utf-8"))
+
+def apply_changes(log_dir, jobs=1, manifest_fn="apply_changes_manifest.json"):
+    """Applies the changes that were logged in a log file or journal, or in the ones in a directory
 
-def apply_changes(log_dir):
-    """Applies the changes that were logged
+    The changes are compacted and applied in a single pass by apply_logs, to the
+    TextGrid files in workingdir/textgrids/, and the changed files are written to
+    changed_textgrid_files/.
 
     Parameters
     ----------
 
     log_dir : str
-        The path of the directory to the log file to be parsed
+        The path of the log file or journal to be parsed, or of a directory with them
+    jobs : int
+        The number of worker processes that apply the changes to different files concurrently
+    manifest_fn : str
+        The path of the JSON manifest that lists the files that were written
 
     Returns:
     --------
 
-    TextGrid
-        a textgrid file that has had changes made on it
-    """
-    
-    log_strings = parse_change_log(log_dir)
-    if log_strings == '': return -1
-    
-    if not os.path.exists('changed_textgrid_files'):
-        os.makedirs('changed_textgrid_files')
-    if not os.path.exists('globally_changed_textgrid_files'):
-        os.makedirs('globally_changed_textgrid_files')
-
-    for log_string in log_strings:
-        # If global change
-        if decode_log_string(log_string)[2] == 'Global':
-            search_word, correction, _ = decode_log_string(log_string)
-
-            working_dir = 'workingdir/textgrids/'
-
-            for root, directories, files in os.walk(working_dir, topdown=True):
-                for fil in (fil for fil in files if fil.endswith('.TextGrid')):
-                    textgrid_dir = os.path.join(root, fil)
-
-                    with open(textgrid_dir,'r') as rf:
-                        read_file = rf.read()
-                    regex = re.compile(search_word)
-                    read_file = regex.sub(correction, read_file)
-                    #fn = 'globally_changed_textgrid_files/' + textgrid_dir.replace('/','__')
-                    tree = 'globally_changed_textgrid_files/' + root
-                    if not os.path.exists(tree):
-                        os.makedirs(tree)
-                    fn = os.path.join('globally_changed_textgrid_files/',textgrid_dir)
-                    with open(fn,'w+') as wf:
-                        wf.write(read_file)
-
-        # else singular file change
-        else:
-            search_word, textgrid_dir, interval, correction = decode_log_string(log_string)
-            with open(textgrid_dir) as f:
-                textgrid = [line for line in f]
-            interval_string = "intervals [" + interval + "]"
-
-            for i in range(0,len(textgrid)):
-                if interval_string in textgrid[i]: 
-                    print(correction)
-                    print(textgrid[i+3])
-                    textgrid[i+3] = textgrid[i+3].replace(search_word,correction).rstrip()
-                    print(textgrid[i+3])
- 
-            fn = os.path.join('changed_textgrid_files/',textgrid_dir)
-            
-            tree = 'changed_textgrid_files/' + "/".join(fn.split('/')[1:-1])
-            if not os.path.exists(tree):
-                os.makedirs(tree)            
-
-            with open(fn,"w+") as f:
-                for line in textgrid: f.write(line)
+    int
+        0 if the changes were applied, or -1 if the log file could not be found
+    """
+
+    if not os.path.exists(log_dir):
+        print("Could not find {}".format(log_dir))
+        print("Check if the log file or journal directory is typed correctly and if the file exists")
+        return -1
 
+    apply_logs([log_dir], jobs=jobs, manifest_fn=manifest_fn)
     return 0
 
+# A line of the text log file, e.g. "INFO:root:2021-02-23 10:00:00,000:Change ...".
+LOG_LINE_RE = re.compile(r'^\w+:[^:]*:(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d+):(.*)$')
+# The logged messages, matched from both ends so that file names may contain spaces.
+CHANGE_MESSAGE_RE = re.compile(r'^Change (\S+) in file (.+) interval (\d+) instance (\d+) to (.*)$')
+GLOBAL_MESSAGE_RE = re.compile(r'^Globally change (\S+) to (.*) in all the transcriptions\.$')
+
+def iter_log_events(log_dir):
+    """Reads the changes in a text log file as journal events.
+
+    Parameters
+    ----------
+
+    log_dir : str
+        The path of the log file
+
+    Returns
+    -------
+
+    generator
+        the change and global change events of the log file, as dictionaries in the
+        format of change_journal
+    """
+
+    session = change_journal.get_session_name(log_dir)
+    with open(log_dir, encoding="utf-8") as f:
+        for seq, line in enumerate(f):
+            line_match = LOG_LINE_RE.match(line.rstrip("\n"))
+            if line_match is None:
+                continue
+            time = "{}.{:0<6}".format(line_match.group(1).replace(" ", "T"), line_match.group(2))
+            message = line_match.group(3)
+
+            match = CHANGE_MESSAGE_RE.match(message)
+            if match is not None:
+                yield {"event": change_journal.CHANGE_EVENT, "time": time, "session": session, "seq": seq,
+                       "word": match.group(1), "file": match.group(2), "interval": int(match.group(3)),
+                       "instance": int(match.group(4)), "correction": match.group(5)}
+                continue
+            match = GLOBAL_MESSAGE_RE.match(message)
+            if match is not None:
+                yield {"event": change_journal.GLOBAL_EVENT, "time": time, "session": session, "seq": seq,
+                       "word": match.group(1), "correction": match.group(2)}
+
+def find_log_files(paths):
+    """Expands directories into the journals and log files in them.
+
+    When both the journal and the text log file of a session are found, only the
+    journal is used, since they record the same decisions.
+
+    Parameters
+    ----------
+
+    paths : list
+        paths of log files, journals or directories with them
+
+    Returns
+    -------
+
+    list
+        the paths of the log files and journals to read
+    """
+
+    log_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            log_files += sorted(glob.glob(os.path.join(path, "journal_*.jsonl")) + glob.glob(os.path.join(path, "logfile_*.txt")))
+        else:
+            log_files.append(path)
+
+    journal_sessions = set([change_journal.get_session_name(fn) for fn in log_files if change_journal.is_journal_fn(fn)])
+    return [fn for fn in log_files
+            if change_journal.is_journal_fn(fn) or change_journal.get_session_name(fn) not in journal_sessions]
+
+def read_events(log_files):
+    """Reads the events of many log files and journals and orders them by time.
+
+    Parameters
+    ----------
+
+    log_files : list
+        the paths of the log files and journals
+
+    Returns
+    -------
+
+    list
+        the events of all the files, ordered by time
+    """
+
+    events = []
+    for log_dir in log_files:
+        if change_journal.is_journal_fn(log_dir):
+            events += change_journal.iter_journal(log_dir)
+        else:
+            events += iter_log_events(log_dir)
+
+    events.sort(key=lambda event: (datetime.datetime.fromisoformat(event["time"]), event.get("session", ""), event.get("seq", 0)))
+    return events
+
+def get_global_chains(global_changes):
+    """Finds the chains among the global changes, e.g. a to b followed by b to c.
+
+    Parameters
+    ----------
+
+    global_changes : list
+        a list of (search_word, correction) tuples in the order they were made
+
+    Returns
+    -------
+
+    list
+        a list with the words of every chain, from the first word to the final correction
+    """
+
+    paths = {}
+    for search_word, correction in global_changes:
+        for word, path in paths.items():
+            if path[-1] == search_word and word != search_word:
+                path.append(correction)
+        paths[search_word] = [search_word, correction]
+
+    return [path for path in paths.values() if len(path) > 2]
+
+def compact_events(events):
+    """Collapses the decisions of many sessions into the smallest set of changes.
+
+    The events are replayed in time order. A later change of the same word occurrence
+    supersedes an earlier one, and a global change of a word subsumes the earlier
+    changes of single occurrences of that word. A single occurrence change is followed
+    through the global changes that were made after it, so a change from a to b
+    followed by a global change from b to c turns that occurrence into c.
+
+    Parameters
+    ----------
+
+    events : list
+        journal events ordered by time
+
+    Returns
+    -------
+
+    tuple
+        a list of (search_word, correction) tuples of the global changes in the order
+        they were made, a dictionary mapping every file to its list of (search_word,
+        interval, instance, correction) tuples, and a dictionary with the number of
+        events, superseded changes, subsumed changes and notes
+    """
+
+    global_changes = []
+    global_positions = []
+    occurrence_changes = {}
+    occurrence_keys = {}
+    stats = {"events": 0, "changes": 0, "global_changes": 0, "notes": 0, "superseded": 0, "subsumed": 0}
+
+    for position, event in enumerate(events):
+        stats["events"] += 1
+        if event["event"] == change_journal.GLOBAL_EVENT:
+            stats["global_changes"] += 1
+            global_changes.append((event["word"], event["correction"]))
+            global_positions.append(position)
+            for key in occurrence_keys.pop(event["word"], set()):
+                del occurrence_changes[key]
+                stats["subsumed"] += 1
+        elif event["event"] == change_journal.CHANGE_EVENT:
+            stats["changes"] += 1
+            key = (os.path.normpath(event["file"]), int(event["interval"]), int(event["instance"]), event["word"])
+            if key in occurrence_changes:
+                stats["superseded"] += 1
+            occurrence_changes[key] = (event["correction"], position)
+            occurrence_keys.setdefault(event["word"], set()).add(key)
+        elif event["event"] == change_journal.NOTE_EVENT:
+            stats["notes"] += 1
+
+    # Follow the corrections through the global changes made after them, remembering the results.
+    followed_corrections = {}
+    file_changes = {}
+    for (textgrid_dir, interval, instance, search_word), (correction, position) in occurrence_changes.items():
+        first_later = bisect.bisect_right(global_positions, position)
+        if (first_later, correction) not in followed_corrections:
+            final_correction = correction
+            for global_word, global_correction in global_changes[first_later:]:
+                if final_correction == global_word:
+                    final_correction = global_correction
+            followed_corrections[(first_later, correction)] = final_correction
+        correction = followed_corrections[(first_later, correction)]
+        file_changes.setdefault(textgrid_dir, []).append((search_word, interval, instance, correction))
+
+    return global_changes, file_changes, stats
+
+def list_textgrid_files(working_dir):
+    """Lists the TextGrid files in a directory and its subdirectories.
+
+    Parameters
+    ----------
+
+    working_dir : str
+        the directory with the TextGrid files
+
+    Returns
+    -------
+
+    list
+        the normalised paths of the TextGrid files, sorted within every directory
+    """
+
+    fn_list = []
+    for root, directories, files in os.walk(working_dir, topdown=True):
+        directories.sort()
+        for fil in sorted(fil for fil in files if fil.endswith('.TextGrid')):
+            fn_list.append(os.path.normpath(os.path.join(root, fil)))
+
+    return fn_list
+
+def get_output_fn(textgrid_dir, input_dir, output_dir):
+    """Finds where to write the changed copy of a TextGrid file.
+
+    The file keeps its path relative to the input directory, so an absolute path
+    never replaces the output directory. A file outside the input directory keeps
+    its whole absolute path below the output directory.
+
+    Parameters
+    ----------
+
+    textgrid_dir : str
+        the path of the TextGrid file
+    input_dir : str
+        the directory with the TextGrid files
+    output_dir : str
+        the directory to write the changed files to
+
+    Returns
+    -------
+
+    str
+        the path to write the changed file to
+    """
+
+    textgrid_path = os.path.abspath(textgrid_dir)
+    rel_fn = os.path.relpath(textgrid_path, os.path.abspath(input_dir))
+    if rel_fn == os.pardir or rel_fn.startswith(os.pardir + os.sep):
+        rel_fn = os.path.splitdrive(textgrid_path)[1].lstrip(os.sep)
+
+    return os.path.join(output_dir, rel_fn)
+
+def apply_compacted_changes(textgrid_dir, changes, replacements, regex, output_dir, input_dir):
+    """Applies the compacted single occurrence and global changes to one TextGrid file.
+
+    A word occurrence with a single occurrence change gets that correction, any other
+    word in the replacement map gets its global correction.
+
+    Parameters
+    ----------
+
+    textgrid_dir : str
+        the path of the TextGrid file
+    changes : list
+        a list of (search_word, interval, instance, correction) tuples
+    replacements : dict
+        a dictionary mapping every word to be changed globally to its final correction
+    regex : re.Pattern
+        the regular expression from get_replacement_regex, or None without global changes
+    output_dir : str
+        the directory to write the changed file to, in the same folder structure
+    input_dir : str
+        the directory with the TextGrid files, see get_output_fn
+
+    Returns
+    -------
+
+    dict
+        a manifest entry for the written file, or None if the output would
+        overwrite the TextGrid file itself
+    """
+
+    fn = get_output_fn(textgrid_dir, input_dir, output_dir)
+    if os.path.realpath(fn) == os.path.realpath(textgrid_dir):
+        print("Not writing {}, since that would overwrite the original file. Choose another output directory.".format(fn))
+        return None
+
+    read_file, encoding = textgrid_reader.read_textgrid(textgrid_dir)
+    items = textgrid_reader.read_tier_items(read_file, tier_index=0)
+
+    item_changes = {}
+    for search_word, interval, instance, correction in changes:
+        if 0 < interval <= len(items) and find_instance(items[interval-1].mark, search_word, instance) is not None:
+            item_changes.setdefault(interval-1, {})[(search_word, instance)] = correction
+        else:
+            print("Could not find instance {} of {} in interval {} of {}. Skipping it.".format(
+                instance, search_word, interval, textgrid_dir))
+
+    changed_marks = {}
+    num_changes = 0
+    for item_idx, item in enumerate(items):
+        instance_changes = item_changes.get(item_idx, {})
+        if not instance_changes and (regex is None or regex.search(item.mark) is None):
+            continue
+
+        pieces = []
+        pos = 0
+        instance_counts = {}
+        for match in re.finditer(r'\S+', item.mark):
+            word = match.group(0)
+            instance_counts[word] = instance_counts.get(word, 0) + 1
+            correction = instance_changes.get((word, instance_counts[word]), replacements.get(word, word))
+            if correction != word:
+                pieces.append(item.mark[pos:match.start()])
+                pieces.append(correction)
+                pos = match.end()
+                num_changes += 1
+        if pieces:
+            pieces.append(item.mark[pos:])
+            changed_marks[item_idx] = "".join(pieces)
+
+    write_file_atomically(fn, splice_marks(read_file, items, changed_marks).encode(encoding))
+
+    return {"kind": "compacted", "source": textgrid_dir, "output": fn, "encoding": encoding, "changes": num_changes}
+
+def apply_compacted_change_sets(change_sets, replacements, output_dir, input_dir):
+    """Applies the compacted changes to a chunk of files.
+
+    Parameters
+    ----------
+
+    change_sets : list
+        a list of (textgrid_dir, changes) tuples, see apply_compacted_changes
+    replacements : dict
+        a dictionary mapping every word to be changed globally to its final correction
+    output_dir : str
+        the directory to write the changed files to, in the same folder structure
+    input_dir : str
+        the directory with the TextGrid files, see get_output_fn
+
+    Returns
+    -------
+
+    list
+        a manifest entry for every file that was written
+    """
+
+    regex = get_replacement_regex(replacements) if replacements else None
+    records = [apply_compacted_changes(textgrid_dir, changes, replacements, regex, output_dir, input_dir) for textgrid_dir, changes in change_sets]
+    return [record for record in records if record is not None]
+
+def apply_logs(log_files, working_dir='workingdir/textgrids/', output_dir='changed_textgrid_files/', jobs=1,
+               manifest_fn="apply_changes_manifest.json"):
+    """Compacts the decisions of many log files and journals and applies them in a single pass.
+
+    Every TextGrid in the working directory is read and written once when there are
+    global changes. Otherwise only the files with single occurrence changes are.
+
+    Parameters
+    ----------
+
+    log_files : list
+        the paths of the log files, journals or directories with them
+    working_dir : str
+        the directory with the TextGrid files to apply global changes to
+    output_dir : str
+        the directory to write the changed files to, with the folder structure
+        below working_dir
+    jobs : int
+        the number of worker processes to use
+    manifest_fn : str
+        the path of the JSON manifest that lists the files that were written
+
+    Returns
+    -------
+
+    list
+        a manifest entry for every file that was written
+    """
+
+    log_files = find_log_files(log_files)
+    global_changes, file_changes, stats = compact_events(read_events(log_files))
+    print("Read {} events from {} files: {} changes, {} global changes and {} notes.".format(
+        stats["events"], len(log_files), stats["changes"], stats["global_changes"], stats["notes"]))
+    print("{} changes were superseded by later changes of the same occurrence and {} were subsumed by global changes.".format(
+        stats["superseded"], stats["subsumed"]))
+    for chain in get_global_chains(global_changes):
+        print("Chained global changes: {}".format(" -> ".join(chain)))
+
+    replacements = compose_global_changes(global_changes)
+    fn_list = list(file_changes)
+    if replacements:
+        # The logged paths may be absolute or relative, whatever the working directory is given as.
+        known_fns = set(os.path.realpath(textgrid_dir) for textgrid_dir in fn_list)
+        fn_list += [textgrid_dir for textgrid_dir in list_textgrid_files(working_dir) if os.path.realpath(textgrid_dir) not in known_fns]
+
+    change_sets = [(textgrid_dir, file_changes.get(textgrid_dir, [])) for textgrid_dir in fn_list]
+    records = map_in_chunks(apply_compacted_change_sets, change_sets, jobs, replacements, output_dir, working_dir)
+    print("{} changes made in {} files.".format(sum(record["changes"] for record in records), len(records)))
+
+    write_manifest(manifest_fn, log_files, records)
+    print("Wrote a summary of the changed files to {}".format(manifest_fn))
+    return records
+
+def parse_command_line_arguments():
+    """Check the command line arguments."""
+    parser = argparse.ArgumentParser(description="Apply the changes logged by Lokisa Spell. Without any log files, asks for one interactively.")
+
+    parser.add_argument(
+        "log_files",
+        nargs="*",
+        help="Log files, journals or directories with them. The decisions of all of them are merged and applied in a single pass.",
+    )
+    parser.add_argument(
+        "--input_text_dir",
+        default="workingdir/textgrids",
+        help="Directory with the TextGrid files to apply the global changes to. The changed files keep their paths relative to it.",
+    )
+    parser.add_argument(
+        "--output_dir",
+        default="changed_textgrid_files",
+        help="Directory where to write the changed TextGrid files. Default is changed_textgrid_files/",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes to use for applying the changes. Use 0 for all the CPU cores. Default is 1.",
+    )
+    parser.add_argument(
+        "--manifest_fn",
+        default="apply_changes_manifest.json",
+        help="File name of the JSON summary of the files that were written.",
+    )
+
+    return parser.parse_args()
+
 def main():
 
+    args = parse_command_line_arguments()
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+
+    if args.log_files:
+        apply_logs(args.log_files, working_dir=args.input_text_dir, output_dir=args.output_dir, jobs=jobs, manifest_fn=args.manifest_fn)
+        return
+
+    # Imported here since importing readline changes input() for every program that imports this module.
+    import readline
+    from tabCompleter import tabCompleter
     tab = tabCompleter()
     readline.set_completer_delims('\t')
     readline.parse_and_bind("tab: complete")
     readline.set_completer(tab.pathCompleter)
 
-    file_name = input("Input logfile directory : ")
+    file_name = input("Input logfile or journal directory : ")
 
     print()
-    if apply_changes(file_name) != -1: print("Changes successfull!")
+    if apply_changes(file_name, jobs=jobs) != -1: print("Changes successfull!")
     else : print('Changes not made')
 if __name__ == "__main__":
     main()
@@ -0,0 +1,96 @@
+"""
+Crash-safe writing of files that other programs and users read.
+
+A file is written to a temporary file in the same directory, which is flushed
+to disk and then renamed to the file name. A crash or an interrupted write
+therefore leaves either the old or the new file behind, never a truncated
+one. The file keeps the permissions of the file that it replaces, and a new
+file gets the permissions that open() would give it, rather than the private
+mode of mkstemp.
+"""
+
+import contextlib
+import os
+import stat
+import tempfile
+import threading
+
+# Setting the umask is the portable way of reading it, which the lock keeps to one thread at a time.
+_umask_lock = threading.Lock()
+
+
+def get_umask():
+    """
+    Return the umask of the process. On Linux it is read from /proc, which leaves it
+    untouched. Elsewhere it is read by setting it and setting it back.
+    """
+    try:
+        with open("/proc/self/status", "r") as fid:
+            for aline in fid:
+                if aline.startswith("Umask:"):
+                    return int(aline.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    with _umask_lock:
+        umask = os.umask(0o022)
+        os.umask(umask)
+    return umask
+
+
+def get_file_mode(fn):
+    """
+    Return the permission bits to give a file that is written to fn: the mode of the
+    existing file, or the mode that open() would give a new file.
+    """
+    try:
+        return stat.S_IMODE(os.stat(fn).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~get_umask()
+
+
+def sync_directory(dir_name):
+    """
+    Flush a rename in the directory to disk, where the platform allows it.
+    """
+    try:
+        dir_fd = os.open(dir_name, os.O_RDONLY)
+    except OSError:
+        # Directories cannot be opened on Windows.
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+@contextlib.contextmanager
+def open_atomically(fn, mode="wb", **kwargs):
+    """
+    Open a temporary file for writing that replaces fn when the with block ends
+    without an error. mode is "wb" or "w", and the other arguments are passed to
+    open(), e.g. the encoding.
+    """
+    out_dir = os.path.dirname(fn) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp_fn = tempfile.mkstemp(dir=out_dir, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as fid:
+            yield fid
+            fid.flush()
+            os.fsync(fid.fileno())
+        os.chmod(tmp_fn, get_file_mode(fn))
+        os.replace(tmp_fn, fn)
+    except BaseException:
+        os.remove(tmp_fn)
+        raise
+    sync_directory(out_dir)
+
+
+def write_file_atomically(fn, data):
+    """
+    Write bytes to a file through open_atomically.
+    """
+    with open_atomically(fn) as fid:
+        fid.write(data)
@@ -0,0 +1,170 @@
+"""
+Vectorised Levenshtein ratio scoring of one word against a whole word list.
+
+Levenshtein.ratio() equals 2 * LCS / (len_a + len_b), so only the length of
+the longest common subsequence (LCS) of every pair is needed. BatchScorer
+encodes the word list once into padded integer arrays, one per word length,
+and computes the LCS of a query word against all the words of a length at
+once with the bit-parallel LCS algorithm of Hyyrö: every bit of a 64 bit
+integer stands for a character of the query word. The ratios are then looked
+up in a table that is filled in with Levenshtein.ratio() itself, so that they
+are bit for bit the same floats as the ones of the scalar code.
+
+NumPy is optional. Without it, or for query words longer than 64 characters,
+the caller should score the words one at a time.
+"""
+
+import Levenshtein
+
+from similarity_index import length_window, select_alternatives
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The query word must fit in the bits of one unsigned integer.
+MAX_QUERY_LENGTH = 64
+
+
+def available():
+    """
+    Return True if NumPy is installed so that batch scoring can be used.
+    """
+    return numpy is not None
+
+
+def popcount(values):
+    """
+    Count the set bits of every element of an array of unsigned 64 bit integers.
+    """
+    if hasattr(numpy, "bitwise_count"):
+        return numpy.bitwise_count(values)
+    values = values - ((values >> numpy.uint64(1)) & numpy.uint64(0x5555555555555555))
+    values = (values & numpy.uint64(0x3333333333333333)) + ((values >> numpy.uint64(2)) & numpy.uint64(0x3333333333333333))
+    values = (values + (values >> numpy.uint64(4))) & numpy.uint64(0x0F0F0F0F0F0F0F0F)
+    return (values * numpy.uint64(0x0101010101010101)) >> numpy.uint64(56)
+
+
+class BatchScorer:
+    """
+    A word list encoded for scoring one query word against all of its words
+    with NumPy.
+    """
+    def __init__(self, wordlist):
+        self.wordlist = list(wordlist)
+        self.char_codes = {}
+        # Code 0 is not used by any character, so that the code of a character that is
+        # not in the word list never matches.
+        for awd in self.wordlist:
+            for ach in awd:
+                if ach not in self.char_codes:
+                    self.char_codes[ach] = len(self.char_codes) + 1
+
+        # Word length -> (array with the index of every word in the word list, array with the character codes of the words).
+        self.length_groups = {}
+        by_length = {}
+        for aidx, awd in enumerate(self.wordlist):
+            by_length.setdefault(len(awd), []).append(aidx)
+        for alen, aindices in sorted(by_length.items()):
+            codes = numpy.zeros((len(aindices), alen), dtype=numpy.intp)
+            for arow, aidx in enumerate(aindices):
+                codes[arow, :] = [self.char_codes[ach] for ach in self.wordlist[aidx]]
+            self.length_groups[alen] = (numpy.array(aindices, dtype=numpy.intp), codes)
+
+        # Sum of the two lengths -> array with the ratio for every LCS length.
+        self.ratio_table = {}
+
+    def get_ratios(self, lensum):
+        """
+        Return the Levenshtein ratios of two words whose lengths add up to lensum,
+        indexed by the length of their LCS. Levenshtein.ratio() only depends on these
+        two numbers, so it is asked for the ratio of a pair of made up words.
+        """
+        ratios = self.ratio_table.get(lensum)
+        if ratios is None:
+            ratios = numpy.array([Levenshtein.ratio("a" * alcs + "b" * (lensum // 2 - alcs),
+                                                    "a" * alcs + "c" * (lensum - lensum // 2 - alcs))
+                                  for alcs in range(lensum // 2 + 1)])
+            self.ratio_table[lensum] = ratios
+        return ratios
+
+    def score(self, inword, ratio_threshold=0.0):
+        """
+        Return two arrays: the indices in the word list of the words whose ratio against
+        inword could reach the threshold, and their Levenshtein ratios.
+        """
+        inlen = len(inword)
+        lo, hi = length_window(inlen, ratio_threshold)
+
+        # The bit mask of the positions of every character in inword, by character code.
+        char_masks = numpy.zeros(len(self.char_codes) + 1, dtype=numpy.uint64)
+        for apos, ach in enumerate(inword):
+            acode = self.char_codes.get(ach)
+            if acode is not None:
+                char_masks[acode] |= numpy.uint64(1 << apos)
+        inmask = numpy.uint64((1 << inlen) - 1)
+
+        all_indices = []
+        all_ratios = []
+        for alen, (aindices, codes) in self.length_groups.items():
+            if alen < lo or alen > hi:
+                continue
+            # Bit-parallel LCS: the zero bits of vv count the length of the LCS so far.
+            vv = numpy.full(len(aindices), numpy.iinfo(numpy.uint64).max, dtype=numpy.uint64)
+            for apos in range(alen):
+                uu = vv & char_masks[codes[:, apos]]
+                vv = (vv + uu) | (vv - uu)
+            lcs = popcount(~vv & inmask).astype(numpy.intp)
+            all_indices.append(aindices)
+            all_ratios.append(self.get_ratios(inlen + alen)[lcs])
+
+        if not all_indices:
+            return numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0)
+        return numpy.concatenate(all_indices), numpy.concatenate(all_ratios)
+
+    def find_matches(self, inword, num_alternatives=None, ratio_threshold=0.0, alive=None):
+        """
+        Same as find_matches_faster(inword, wordlist, ...) where wordlist is the
+        encoded word list, restricted to the words in the alive set when one is given.
+        Returns a list with tuples (word_label, Levenshtein_ratio).
+
+        Instead of sorting all the ratios, only the best ones are picked out with a
+        partial sort, enough of them to hold the distinct ratios that are needed.
+        """
+        if len(inword) > MAX_QUERY_LENGTH:
+            if alive is None:
+                wordlist = self.wordlist
+            else:
+                wordlist = [awd for awd in self.wordlist if awd in alive]
+            match_ratios = sorted([(awd, Levenshtein.ratio(inword, awd)) for awd in wordlist], reverse=True, key=lambda xx: xx[1])
+            return select_alternatives(match_ratios, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
+
+        indices, ratios = self.score(inword, ratio_threshold)
+        keep = ratios >= ratio_threshold
+        if alive is not None:
+            keep &= numpy.array([self.wordlist[aidx] in alive for aidx in indices], dtype=bool)
+        indices = indices[keep]
+        ratios = ratios[keep]
+
+        if num_alternatives and len(ratios) > 0:
+            # The query word itself takes up one more distinct ratio.
+            num_ratios = num_alternatives + (1 if ratios.max() == 1.0 else 0)
+            num_best = min(len(ratios), 4 * num_ratios)
+            while num_best < len(ratios):
+                best = numpy.argpartition(-ratios, num_best - 1)[:num_best]
+                best_ratios = numpy.unique(ratios[best])[::-1]
+                # All the words with one of the num_ratios highest ratios are among the best only
+                # if a lower ratio made it in too.
+                if len(best_ratios) > num_ratios:
+                    keep = ratios >= best_ratios[num_ratios - 1]
+                    indices = indices[keep]
+                    ratios = ratios[keep]
+                    break
+                num_best *= 2
+
+        # Sort from the highest to the lowest ratio, with ties in the word list order.
+        order = numpy.lexsort((indices, -ratios))
+        match_ratios = [(self.wordlist[aidx], arat) for aidx, arat in zip(indices[order].tolist(), ratios[order].tolist())]
+
+        return select_alternatives(match_ratios, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
@@ -0,0 +1,56 @@
+"""
+Compare the time it takes to find the closest matches of a sample of words in
+a synthetic vocabulary with find_matches_faster and with batch_scoring.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_batch_scoring
+"""
+
+import argparse
+import random
+import time
+
+import batch_scoring
+from lokisa import find_matches_faster
+from benchmarks.synthetic_corpus import make_vocabulary
+from benchmarks.timing import time_repeated
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_types", type=int, default=50000)
+    parser.add_argument("--num_queries", type=int, default=50)
+    parser.add_argument("--num_alternatives", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if not batch_scoring.available():
+        raise SystemExit("NumPy is not installed.")
+
+    wordlist = make_vocabulary(args.num_types)
+    queries = random.Random(1).sample(wordlist, args.num_queries)
+
+    start = time.perf_counter()
+    scorer = batch_scoring.BatchScorer(wordlist)
+    encode_time = time.perf_counter() - start
+
+    for ratio_threshold in (0.0, 0.7):
+        scalar_times, scalar_matches = time_repeated(
+            lambda: [find_matches_faster(inword, wordlist, num_alternatives=args.num_alternatives, ratio_threshold=ratio_threshold) for inword in queries],
+            args.repeats)
+        batch_times, batch_matches = time_repeated(
+            lambda: [scorer.find_matches(inword, num_alternatives=args.num_alternatives, ratio_threshold=ratio_threshold) for inword in queries],
+            args.repeats)
+        scalar_time, batch_time = min(scalar_times), min(batch_times)
+
+        if scalar_matches != batch_matches:
+            raise RuntimeError("batch_scoring and find_matches_faster disagree.")
+        print("threshold {:.1f}: find_matches_faster {:7.3f}s, batch_scoring {:7.3f}s, speedup {:5.1f}x".format(
+            ratio_threshold, scalar_time, batch_time, scalar_time / batch_time))
+
+    print("Encoding {} types took {:.3f}s.".format(len(wordlist), encode_time))
+
+
+if __name__ == "__main__":
+    main()
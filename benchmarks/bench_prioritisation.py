@@ -0,0 +1,71 @@
+"""
+Time prioritise_word_types on a large synthetic vocabulary: interning the word
+types, ordering them with the mandatory words on top and grouping the first
+word sets, where every grouped type is taken out of the ones that are left.
+The grouping of the whole list is only timed with --group_all, since it
+searches the neighbourhood of every type. Lookups in the TypeVocabulary are
+timed as well.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_prioritisation
+"""
+
+import argparse
+import collections
+import random
+
+import lokisa
+from lokisa import PRIORITISED_LIST_RATIO_THRESHOLD, PRIORITISED_LIST_MAX_ALTERNATIVES
+from benchmarks.synthetic_corpus import make_vocabulary
+from benchmarks.timing import quiet, time_repeated
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_types", type=int, default=100000)
+    parser.add_argument("--num_mandatory", type=int, default=500)
+    parser.add_argument("--num_word_sets", type=int, default=1000, help="Number of word sets to group. Default is 1000.")
+    parser.add_argument("--group_all", action="store_true", help="Also time the grouping of the whole list.")
+    parser.add_argument("--num_lookups", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    typeslist = make_vocabulary(args.num_types)
+    counts_dict = lokisa.get_token_counts(collections.Counter({awd: rnd.randint(1, 100) for awd in typeslist}))
+    # Mandatory words from all over the list, and a few that are not in the vocabulary.
+    mandatory_wordlist = rnd.sample(typeslist, args.num_mandatory) + ["notaword{}".format(aidx) for aidx in range(10)]
+    lookups = rnd.sample(typeslist, args.num_lookups // 2) + ["notaword{}".format(aidx) for aidx in range(args.num_lookups // 2)]
+
+    def prioritise():
+        return lokisa.prioritise_word_types(counts_dict, mandatory_wordlist=mandatory_wordlist, num_alternatives=PRIORITISED_LIST_MAX_ALTERNATIVES,
+                                            ratio_threshold=PRIORITISED_LIST_RATIO_THRESHOLD, lazy=True)
+
+    times, (prioritised_list, vocab, _) = time_repeated(prioritise, args.repeats, hide_output=True)
+    mandatory_in_vocab = list(dict.fromkeys(amanwd for amanwd in mandatory_wordlist if amanwd in vocab))
+    if [vocab.words[wid] for wid in prioritised_list.order[:len(mandatory_in_vocab)]] != mandatory_in_vocab:
+        raise RuntimeError("The mandatory words are not at the top of the prioritised list.")
+    print("Interning and ordering {} types with {} mandatory words: {:7.3f}s".format(len(vocab), len(mandatory_wordlist), min(times)))
+
+    def group_first():
+        prioritised_list, _, _ = prioritise()
+        prioritised_list.extend_to(args.num_word_sets - 1)
+        return prioritised_list
+
+    times, prioritised_list = time_repeated(group_first, args.repeats, hide_output=True)
+    print("Ordering and grouping the first {} word sets ({} types): {:7.3f}s".format(
+        len(prioritised_list.word_sets), prioritised_list.num_grouped, min(times)))
+
+    if args.group_all:
+        with quiet():
+            prioritised_list, _, _ = prioritise()
+        times, _ = time_repeated(prioritised_list.group_all, 1, hide_output=True)
+        print("Grouping all {} word sets: {:7.3f}s".format(len(prioritised_list.word_sets), min(times)))
+
+    times, found = time_repeated(lambda: [awd in vocab for awd in lookups], args.repeats)
+    print("{} vocabulary lookups: {:7.5f}s ({} found)".format(len(lookups), min(times), sum(found)))
+
+
+if __name__ == "__main__":
+    main()
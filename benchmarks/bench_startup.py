@@ -0,0 +1,68 @@
+"""
+Check that importing lokisa stays within a startup time budget, and that it
+does not pull in the heavy packages that are only imported on first use
+(nltk is not used any more). Every measurement starts a fresh interpreter,
+and the time of an interpreter that imports nothing is subtracted.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_startup
+
+The exit status is 1 if the budget is exceeded or a deferred package is
+imported at startup.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Packages that must not be imported by "import lokisa".
+DEFERRED_MODULES = ["nltk", "tqdm", "Levenshtein", "textgrid", "numpy"]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_interpreter(code, repeats):
+    """
+    Return the best wall time of running the code in a fresh interpreter from the repository root.
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget_ms", type=float, default=150.0,
+        help="The most time that importing lokisa may add to the start of the interpreter, in milliseconds.")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    check_code = "import sys, lokisa; print(' '.join(amod for amod in {!r} if amod in sys.modules))".format(DEFERRED_MODULES)
+    imported = subprocess.run([sys.executable, "-c", check_code], cwd=REPO_DIR, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+
+    bare_time = time_interpreter("pass", args.repeats)
+    lokisa_time = time_interpreter("import lokisa", args.repeats)
+    import_ms = (lokisa_time - bare_time) * 1000
+    print("Interpreter start {:6.1f} ms, with import lokisa {:6.1f} ms: the import takes {:6.1f} ms (budget {:.0f} ms).".format(
+        bare_time * 1000, lokisa_time * 1000, import_ms, args.budget_ms))
+
+    failed = False
+    if imported:
+        print("Imported at startup although they should be deferred: {}".format(", ".join(imported)))
+        failed = True
+    if import_ms > args.budget_ms:
+        print("The import of lokisa is over its budget.")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Compare the time it takes to read the tier-0 marks of a synthetic TextGrid
+corpus with the textgrid package and with textgrid_reader.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_textgrid_reader
+"""
+
+import argparse
+import tempfile
+
+import textgrid
+
+import textgrid_reader
+from benchmarks.synthetic_corpus import write_textgrid_corpus
+from benchmarks.timing import time_repeated
+
+
+def read_with_textgrid_package(fn_list):
+    return [[interval.mark for interval in textgrid.TextGrid.fromFile(afn)[0]] for afn in fn_list]
+
+
+def read_with_textgrid_reader(fn_list):
+    return [textgrid_reader.read_tier_marks(afn) for afn in fn_list]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_files", type=int, default=200)
+    parser.add_argument("--num_intervals", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    for short in (False, True):
+        for encoding in ("utf-8", "utf-16"):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                fn_list = write_textgrid_corpus(tmpdir, num_files=args.num_files, num_intervals=args.num_intervals,
+                                                short=short, encoding=encoding)
+                package_times, package_marks = time_repeated(lambda: read_with_textgrid_package(fn_list), args.repeats)
+                reader_times, reader_marks = time_repeated(lambda: read_with_textgrid_reader(fn_list), args.repeats)
+                package_time, reader_time = min(package_times), min(reader_times)
+
+            if package_marks != reader_marks:
+                raise RuntimeError("textgrid_reader and the textgrid package disagree.")
+            print("{:5} {:6}: textgrid package {:7.3f}s, textgrid_reader {:7.3f}s, speedup {:5.1f}x".format(
+                "short" if short else "long", encoding, package_time, reader_time, package_time / reader_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Time the hot paths of Lokisa Spell on synthetic corpora of several sizes and
+write the results to a JSON file, so that the timings of two runs, e.g. before
+and after a change, can be compared.
+
+For every scale and input format a corpus is generated with a Zipfian
+vocabulary and spelling variant noise, and these steps are timed in the order
+of a session:
+
+* get_text_all, split_list, get_token_counts and get_prioritised_list on the
+  whole corpus,
+* the lookup of the matches of a sample of word types, both with the
+  SimilarityIndex that a session uses (including building it) and with
+  the linear find_matches_faster, and build_worklist for the sample,
+* apply_changes with a journal of single and global changes (TextGrid only).
+
+Run from the repository root with:
+
+    python -m benchmarks.run_benchmarks --scales small medium --output results.json
+    python -m benchmarks.run_benchmarks --compare results.json
+
+Every step is repeated and the best time is the one to compare.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+
+import apply_log_changes
+import batch_scoring
+import lokisa
+from lokisa import PRIORITISED_LIST_RATIO_THRESHOLD, PRIORITISED_LIST_MAX_ALTERNATIVES, RATIO_THRESHOLD, MAX_ALTERNATIVES, SEARCH_RATIO_THRESHOLD
+from change_journal import ChangeJournal
+from similarity_index import SimilarityIndex
+from benchmarks.synthetic_corpus import write_plaintext_corpus, write_textgrid_corpus
+from benchmarks.timing import quiet, time_repeated
+
+# Increase this when the layout of the results changes.
+RESULTS_VERSION = 1
+
+# Corpus sizes: number of files, intervals (or lines) per file and word types in the vocabulary.
+SCALES = {
+    "tiny": {"num_files": 5, "num_intervals": 20, "num_types": 500},
+    "small": {"num_files": 20, "num_intervals": 50, "num_types": 2000},
+    "medium": {"num_files": 100, "num_intervals": 100, "num_types": 8000},
+    "large": {"num_files": 400, "num_intervals": 200, "num_types": 30000},
+}
+
+
+
+def make_result(name, scale, informat, times, count, params=None):
+    return {
+        "name": name,
+        "scale": scale,
+        "format": informat,
+        "params": params or {},
+        "count": count,
+        "best_s": min(times),
+        "mean_s": sum(times) / len(times),
+        "times_s": times,
+    }
+
+
+def write_journal(journal_fn, inputtext, words, rnd, num_changes, num_global_changes):
+    """
+    Record random decisions about the occurrences of the words in a journal, as a session
+    of Lokisa Spell would. Returns the number of recorded changes.
+    """
+    num_recorded = 0
+    with ChangeJournal(journal_fn) as journal:
+        for awd in words[:num_global_changes]:
+            journal.global_change(awd, awd + "x")
+            num_recorded += 1
+        occurrences = [(awd, aitem) for awd in words[num_global_changes:] for aitem in inputtext.build_worklist(awd)]
+        for awd, (occ_cnt, afn, icnt, icount) in rnd.sample(occurrences, min(num_changes, len(occurrences))):
+            journal.change(awd, afn, icnt + 1, icount + 1, awd.upper())
+            num_recorded += 1
+    return num_recorded
+
+
+def bench_corpus(scale, informat, args):
+    """
+    Generate a corpus and time the hot paths on it. Returns a list of results.
+    """
+    scale_params = dict(SCALES[scale])
+    corpus_params = dict(scale_params, zipf_exponent=args.zipf_exponent, variant_rate=args.variant_rate, seed=args.seed)
+    rnd = random.Random(args.seed)
+    results = []
+
+    work_dir = tempfile.mkdtemp(prefix="lokisa_bench_")
+    old_cwd = os.getcwd()
+    try:
+        # apply_changes works on workingdir/textgrids/ and writes its output to the current directory.
+        os.chdir(work_dir)
+        input_dir = os.path.join("workingdir", "textgrids")
+        os.makedirs(input_dir)
+        write_corpus = write_textgrid_corpus if informat == "textgrid" else write_plaintext_corpus
+        write_corpus(input_dir, **corpus_params)
+
+        def add_result(name, times, count, params=None):
+            results.append(make_result(name, scale, informat, times, count, dict(corpus_params, **(params or {}))))
+            print("{:8} {:10} {:22} best {:9.4f}s  mean {:9.4f}s  ({} items)".format(
+                scale, informat, name, min(times), sum(times) / len(times), count))
+
+        inputtext = lokisa.InputText(directory=input_dir, informat=informat)
+        times, text = time_repeated(lambda: inputtext.get_text_all(jobs=args.jobs), args.repeats, hide_output=True)
+        add_result("get_text_all", times, len(text), {"jobs": args.jobs})
+
+        times, tokens = time_repeated(lambda: lokisa.split_list(text), args.repeats, hide_output=True)
+        add_result("split_list", times, len(tokens))
+
+        times, counts_dict = time_repeated(lambda: lokisa.get_token_counts(tokens), args.repeats, hide_output=True)
+        add_result("get_token_counts", times, len(counts_dict))
+
+        list_params = {"ratio_threshold": PRIORITISED_LIST_RATIO_THRESHOLD, "num_alternatives": PRIORITISED_LIST_MAX_ALTERNATIVES, "jobs": args.jobs}
+        times, (prioritised_list, typeslist, _) = time_repeated(lambda: lokisa.get_prioritised_list(tokens, **list_params), args.repeats, hide_output=True)
+        add_result("get_prioritised_list", times, len(prioritised_list), list_params)
+
+        queries = rnd.sample(typeslist, min(args.num_queries, len(typeslist)))
+        match_params = {"ratio_threshold": RATIO_THRESHOLD, "num_alternatives": MAX_ALTERNATIVES, "num_queries": len(queries)}
+        times, _ = time_repeated(lambda: [lokisa.find_matches_faster(awd, typeslist, num_alternatives=MAX_ALTERNATIVES, ratio_threshold=RATIO_THRESHOLD)
+                                          for awd in queries], args.repeats, hide_output=True)
+        add_result("find_matches_faster", times, len(queries), match_params)
+
+        # The lookups of a session go through a similarity index, built for the lowest threshold of its searches.
+        index_params = {"ratio_threshold": min(RATIO_THRESHOLD, SEARCH_RATIO_THRESHOLD)}
+        times, simindex = time_repeated(lambda: SimilarityIndex(typeslist, **index_params), args.repeats, hide_output=True)
+        add_result("SimilarityIndex", times, len(typeslist), index_params)
+
+        times, _ = time_repeated(lambda: [simindex.find_matches(awd, num_alternatives=MAX_ALTERNATIVES, ratio_threshold=RATIO_THRESHOLD) for awd in queries],
+                                 args.repeats, hide_output=True)
+        add_result("simindex_find_matches", times, len(queries), match_params)
+
+        times, worklists = time_repeated(lambda: [inputtext.build_worklist(awd) for awd in queries], args.repeats, hide_output=True)
+        add_result("build_worklist", times, sum(len(worklist) for worklist in worklists), {"num_queries": len(queries)})
+
+        if informat == "textgrid":
+            journal_fn = os.path.join("log", "journal_benchmark.jsonl")
+            os.makedirs("log")
+            num_changes = write_journal(journal_fn, inputtext, queries, rnd, args.num_changes, args.num_global_changes)
+            times, retcode = time_repeated(lambda: apply_log_changes.apply_changes(journal_fn, jobs=args.jobs), args.repeats, hide_output=True)
+            if retcode != 0:
+                raise RuntimeError("apply_changes failed.")
+            add_result("apply_changes", times, num_changes, {"num_global_changes": args.num_global_changes, "jobs": args.jobs})
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(work_dir)
+
+    return results
+
+
+def compare_results(results, old_results):
+    """
+    Print the ratio of the best times of the steps that both runs timed.
+    """
+    old_best = {(aresult["name"], aresult["scale"], aresult["format"]): aresult["best_s"] for aresult in old_results["results"]}
+    print("\nCompared with the run of {}:".format(old_results.get("created", "unknown")))
+    for aresult in results:
+        akey = (aresult["name"], aresult["scale"], aresult["format"])
+        if akey in old_best and old_best[akey] > 0:
+            print("{:8} {:10} {:22} {:9.4f}s -> {:9.4f}s  {:6.2f}x".format(
+                aresult["scale"], aresult["format"], aresult["name"], old_best[akey], aresult["best_s"], aresult["best_s"] / old_best[akey]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", nargs="+", choices=sorted(SCALES), default=["small", "medium"],
+        help="The corpus sizes to run. Default is small and medium.")
+    parser.add_argument("--formats", nargs="+", choices=["textgrid", "plaintext"], default=["textgrid", "plaintext"],
+        help="The input formats to run. Default is both.")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of times to run every step. Default is 3.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes for the steps that can use them. Default is 1.")
+    parser.add_argument("--num_queries", type=int, default=20, help="Number of word types to find matches and build worklists for. Default is 20.")
+    parser.add_argument("--num_changes", type=int, default=200, help="Number of single occurrence changes to apply. Default is 200.")
+    parser.add_argument("--num_global_changes", type=int, default=5, help="Number of global changes to apply. Default is 5.")
+    parser.add_argument("--zipf_exponent", type=float, default=1.1, help="Exponent of the Zipfian word frequencies. Default is 1.1.")
+    parser.add_argument("--variant_rate", type=float, default=0.05, help="Fraction of the tokens that are spelling variants. Default is 0.05.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results. Default is benchmark_results.json")
+    parser.add_argument("--compare", help="JSON file with the results of an earlier run to compare with.")
+    args = parser.parse_args()
+
+    # Read the earlier results first, since the output may overwrite them.
+    old_results = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fid:
+            old_results = json.load(fid)
+
+    # Import the packages that lokisa imports on first use, so that their import is not timed.
+    with quiet():
+        lokisa.find_matches_faster("a", ["a"])
+        list(lokisa.tqdm([]))
+
+    results = []
+    for scale in args.scales:
+        for informat in args.formats:
+            results += bench_corpus(scale, informat, args)
+
+    with open(args.output, "w", encoding="utf-8") as fid:
+        json.dump({
+            "version": RESULTS_VERSION,
+            "created": datetime.datetime.now().isoformat(),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": batch_scoring.available(),
+            "settings": vars(args),
+            "results": results,
+            }, fid, indent=2)
+    print("Wrote the results to {}".format(args.output))
+
+    if old_results is not None:
+        compare_results(results, old_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Generate synthetic TextGrid and plain text corpora for the benchmarks.
+
+The words are drawn uniformly from the vocabulary by default. With a Zipf
+exponent, the word of rank r is drawn with a weight of 1 / r**exponent, which
+is closer to the word frequencies of real transcriptions. With a variant rate,
+that fraction of the tokens is replaced by a spelling variant of the word, one
+of a few fixed misspellings per word, so that the corpus has the clusters of
+close spellings that Lokisa Spell looks for.
+"""
+
+import itertools
+import os
+import random
+
+
+def make_vocabulary(num_types, seed=1):
+    """
+    Return a sorted list of made-up word types built from CV syllables.
+    """
+    rnd = random.Random(seed)
+    consonants = "bcdfgjklmnprstwyɲŋ"
+    vowels = "aeiouɛɔ"
+    words = set()
+    while len(words) < num_types:
+        num_syllables = rnd.randint(1, 5)
+        words.add("".join(rnd.choice(consonants) + rnd.choice(vowels) for _ in range(num_syllables)))
+    return sorted(words)
+
+
+def make_variant(rnd, awd, letters):
+    """
+    Return a misspelling of the word with one letter substituted, deleted,
+    inserted or doubled.
+    """
+    apos = rnd.randrange(len(awd))
+    edit = rnd.choice(["substitute", "delete", "insert", "double"]) if len(awd) > 1 else "insert"
+    if edit == "substitute":
+        return awd[:apos] + rnd.choice(letters) + awd[apos + 1:]
+    if edit == "delete":
+        return awd[:apos] + awd[apos + 1:]
+    if edit == "insert":
+        return awd[:apos] + rnd.choice(letters) + awd[apos:]
+    return awd[:apos] + awd[apos] + awd[apos:]
+
+
+def make_transcriptions(num_files, num_intervals, num_types, words_per_interval=8, seed=1,
+                        zipf_exponent=None, variant_rate=0.0, variants_per_word=2):
+    """
+    Return a list with the marks of every file, i.e. the transcription of every interval
+    or line. The defaults give a uniform vocabulary without spelling variants.
+    """
+    rnd = random.Random(seed)
+    vocabulary = make_vocabulary(num_types, seed=seed)
+    if zipf_exponent:
+        # Shuffle the vocabulary so that the frequent words are not the alphabetically first ones.
+        ranked = list(vocabulary)
+        random.Random(seed + 1).shuffle(ranked)
+        cum_weights = list(itertools.accumulate(1.0 / (arank ** zipf_exponent) for arank in range(1, num_types + 1)))
+        draw_word = lambda: rnd.choices(ranked, cum_weights=cum_weights)[0]
+    else:
+        draw_word = lambda: rnd.choice(vocabulary)
+
+    variants = {}
+    if variant_rate:
+        letters = sorted(set("".join(vocabulary)))
+        vrnd = random.Random(seed + 2)
+        variants = {awd: [make_variant(vrnd, awd, letters) for _ in range(variants_per_word)] for awd in vocabulary}
+
+    def draw_token():
+        awd = draw_word()
+        if variant_rate and rnd.random() < variant_rate:
+            return rnd.choice(variants[awd])
+        return awd
+
+    return [[" ".join(draw_token() for _ in range(rnd.randint(0, 2 * words_per_interval))) for _ in range(num_intervals)]
+            for _ in range(num_files)]
+
+
+def format_textgrid(tiers, short=False):
+    """
+    Return the text of a TextGrid file with the given tiers, a list of
+    (tier_name, marks) tuples where every mark gets a one second interval.
+    """
+    xmax = float(max([len(marks) for _, marks in tiers] + [1]))
+    if short:
+        lines = ['File type = "ooTextFile short"', '"TextGrid"', '', '0', str(xmax), '<exists>', str(len(tiers))]
+        for tier_name, marks in tiers:
+            lines += ['"IntervalTier"', '"{}"'.format(tier_name), '0', str(xmax), str(len(marks))]
+            for aidx, amark in enumerate(marks):
+                lines += [str(float(aidx)), str(float(aidx + 1)), '"{}"'.format(amark.replace('"', '""'))]
+    else:
+        lines = ['File type = "ooTextFile"', 'Object class = "TextGrid"', '',
+                 'xmin = 0', 'xmax = {}'.format(xmax), 'tiers? <exists>', 'size = {}'.format(len(tiers)), 'item []:']
+        for tier_idx, (tier_name, marks) in enumerate(tiers, 1):
+            lines += ['    item [{}]:'.format(tier_idx),
+                      '        class = "IntervalTier"',
+                      '        name = "{}"'.format(tier_name),
+                      '        xmin = 0',
+                      '        xmax = {}'.format(xmax),
+                      '        intervals: size = {}'.format(len(marks))]
+            for aidx, amark in enumerate(marks):
+                lines += ['        intervals [{}]:'.format(aidx + 1),
+                          '            xmin = {}'.format(float(aidx)),
+                          '            xmax = {}'.format(float(aidx + 1)),
+                          '            text = "{}"'.format(amark.replace('"', '""'))]
+    return "\n".join(lines) + "\n"
+
+
+def write_textgrid_corpus(directory, num_files=100, num_intervals=50, num_types=5000, words_per_interval=8, seed=1,
+                          short=False, encoding="utf-8", zipf_exponent=None, variant_rate=0.0):
+    """
+    Write a corpus of TextGrid files with random transcriptions to the directory.
+    Returns the list of file names.
+    """
+    fn_list = []
+    for file_idx, marks in enumerate(make_transcriptions(num_files, num_intervals, num_types, words_per_interval=words_per_interval,
+                                                         seed=seed, zipf_exponent=zipf_exponent, variant_rate=variant_rate)):
+        fn = os.path.join(directory, "file_{:05d}.TextGrid".format(file_idx))
+        with open(fn, "w", encoding=encoding) as fid:
+            fid.write(format_textgrid([("words", marks), ("notes", marks[::2])], short=short))
+        fn_list.append(fn)
+    return fn_list
+
+
+def write_plaintext_corpus(directory, num_files=100, num_intervals=50, num_types=5000, words_per_interval=8, seed=1,
+                           encoding="utf-8", zipf_exponent=None, variant_rate=0.0):
+    """
+    Write a corpus of plain text files, with one transcription per line, to the directory.
+    Returns the list of file names.
+    """
+    fn_list = []
+    for file_idx, marks in enumerate(make_transcriptions(num_files, num_intervals, num_types, words_per_interval=words_per_interval,
+                                                         seed=seed, zipf_exponent=zipf_exponent, variant_rate=variant_rate)):
+        fn = os.path.join(directory, "file_{:05d}.txt".format(file_idx))
+        with open(fn, "w", encoding=encoding) as fid:
+            fid.write("".join(amark + "\n" for amark in marks))
+        fn_list.append(fn)
+    return fn_list
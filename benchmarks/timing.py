@@ -0,0 +1,32 @@
+"""
+The timing helper that the benchmarks share.
+"""
+
+import contextlib
+import io
+import time
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Hide the messages and progress bars of the timed functions.
+    """
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def time_repeated(fun, repeats, hide_output=False):
+    """
+    Run fun repeats times, with its output hidden if hide_output is set.
+    Returns the list of wall times and the result of the last run. The best
+    time, min(times), is the one to compare.
+    """
+    times = []
+    result = None
+    for _ in range(repeats):
+        with quiet() if hide_output else contextlib.nullcontext():
+            start = time.perf_counter()
+            result = fun()
+            times.append(time.perf_counter() - start)
+    return times, result
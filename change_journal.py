@@ -0,0 +1,125 @@
+"""
+A structured journal of the decisions made in Lokisa Spell.
+
+The text log file is meant to be read by people. The journal records the
+same changes, global changes and notes as JSON Lines, one event per line,
+so that apply_log_changes.py can read them back without having to parse
+the log messages. Paths and words that contain spaces are kept intact.
+
+The journal is only ever appended to. Events are buffered and the journal
+is flushed and synced to disk by the caller at convenient points, e.g. when
+going back to the main menu, so that a crash loses at most the decisions
+made since then. A line that was cut off by a crash is skipped when the
+journal is read.
+"""
+
+import os
+import datetime
+import json
+import logging
+
+# Increase this when the layout of the events changes.
+JOURNAL_VERSION = 1
+
+# The kinds of events that describe decisions.
+CHANGE_EVENT = "change"
+GLOBAL_EVENT = "global"
+NOTE_EVENT = "note"
+
+
+class ChangeJournal:
+    """
+    An append-only JSON Lines journal of the decisions of one session.
+    """
+    def __init__(self, journal_fn, session=None, buffer_size=64*1024):
+        self.journal_fn = journal_fn
+        self.session = session if session is not None else get_session_name(journal_fn)
+        self.seq = 0
+        self.fid = open(journal_fn, "a", encoding="utf-8", buffering=buffer_size)
+        self.record("start", version=JOURNAL_VERSION)
+
+    def record(self, event, **fields):
+        """
+        Append an event to the journal. The event is only buffered, use sync()
+        to make sure that it is on disk.
+        """
+        aevent = {"event": event, "time": datetime.datetime.now().isoformat(), "session": self.session, "seq": self.seq}
+        aevent.update(fields)
+        self.fid.write(json.dumps(aevent, ensure_ascii=False) + "\n")
+        self.seq += 1
+
+    def change(self, word, afn, interval, instance, correction):
+        """
+        Record the change of one occurrence of a word. The interval (or line)
+        and instance numbers count from 1, as in the log file.
+        """
+        self.record(CHANGE_EVENT, word=word, file=afn, interval=interval, instance=instance, correction=correction)
+
+    def global_change(self, word, correction):
+        """
+        Record the change of all the occurrences of a word.
+        """
+        self.record(GLOBAL_EVENT, word=word, correction=correction)
+
+    def note(self, word, afn, interval, instance, note):
+        """
+        Record a note about one occurrence of a word.
+        """
+        self.record(NOTE_EVENT, word=word, file=afn, interval=interval, instance=instance, note=note)
+
+    def sync(self):
+        """
+        Write the buffered events to disk.
+        """
+        self.fid.flush()
+        os.fsync(self.fid.fileno())
+
+    def close(self):
+        if not self.fid.closed:
+            self.sync()
+            self.fid.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_session_name(fn):
+    """
+    Return the name of the session that wrote a journal or a text log file, i.e.
+    the date and time in its file name. The journal and the log file of the same
+    session get the same name.
+    """
+    session = os.path.splitext(os.path.basename(fn))[0]
+    for aprefix in ("journal_", "logfile_"):
+        if session.startswith(aprefix):
+            return session[len(aprefix):]
+    return session
+
+
+def is_journal_fn(fn):
+    """
+    Return True if the file name is that of a journal rather than a text log file.
+    """
+    return fn.endswith(".jsonl")
+
+
+def iter_journal(journal_fn):
+    """
+    Read the events of a journal one at a time, so that long journals are never
+    held in memory. Lines that cannot be decoded, e.g. a last line that was cut
+    off by a crash, are skipped.
+    """
+    with open(journal_fn, "r", encoding="utf-8") as fid:
+        for line_cnt, aline in enumerate(fid, 1):
+            if not aline.strip():
+                continue
+            try:
+                aevent = json.loads(aline)
+            except ValueError:
+                logging.warning("Skipping line {} of the journal {}: it is not valid JSON.".format(line_cnt, journal_fn))
+                continue
+            if isinstance(aevent, dict) and "event" in aevent:
+                yield aevent
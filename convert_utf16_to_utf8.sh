@@ -1,5 +1,7 @@
 #!/bin/bash
 # A script to change all TextGrid utf-16 files into utf-8
+# Lokisa Spell and apply_log_changes.py read utf-16 files directly, so this is
+# only needed for other tools that expect utf-8.
 # The cd workingdir/textgrids/ line can be altered as to where 
 # the user prefers the changes to recursively occur from
 cd workingdir/textgrids/
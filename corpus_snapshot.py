@@ -0,0 +1,171 @@
+"""
+On-disk snapshots of the prepared corpus.
+
+Preparing a corpus for Lokisa Spell (parsing every file, counting the tokens
+and grouping the word types into word sets) gives the same result for as
+long as the input files and the settings stay the same. A snapshot stores
+that result so that the next session can load it instead of redoing the work.
+
+A snapshot is keyed on the settings that the result depends on and is only
+loaded when the key matches. It also stores the path, size and mtime of every
+input file, so that the caller can bring it up to date for the files that
+changed since it was saved. A snapshot that cannot be read or fails its
+checksum is ignored so that the caller rebuilds it.
+
+Snapshots are shared between the accounts that work on a corpus, so the data
+is stored as JSON, which loading cannot turn into code, rather than pickled.
+The checksum only detects damage, not changes on purpose. The occurrence index
+is stored as the raw bytes of its arrays, which are only loaded on a machine
+with the same layout of the array items.
+"""
+
+import os
+import sys
+import base64
+import hashlib
+import json
+import logging
+from array import array
+
+from atomic_write import open_atomically
+from vocabulary import TypeVocabulary, CountVocabulary
+
+# Increase this when the layout of the snapshot data changes.
+SNAPSHOT_VERSION = 6
+SNAPSHOT_MAGIC = b"LOKISA-SNAPSHOT\n"
+# The typecode of the occurrence index arrays.
+OCCURRENCES_TYPECODE = "i"
+
+
+def get_snapshot_fn(snapshot_dir, input_text_dir, informat):
+    """
+    Return the snapshot file name for an input directory, so that snapshots of
+    different corpora can be kept side by side.
+    """
+    dir_digest = hashlib.sha1("{}:{}".format(os.path.abspath(input_text_dir), informat).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(snapshot_dir, "snapshot_{}.json".format(dir_digest))
+
+
+def get_snapshot_key(settings):
+    """
+    Return a digest of the settings, given as a dictionary.
+    """
+    key_items = (SNAPSHOT_VERSION, sorted(settings.items()))
+    return hashlib.sha256(repr(key_items).encode("utf-8")).hexdigest()
+
+
+def encode_snapshot_data(data):
+    """
+    Return the data of a prepared corpus as a dictionary that can be written as JSON.
+    The word types of the occurrence index are listed with the length of their arrays,
+    and the arrays themselves are joined into one base64 string.
+    """
+    occurrences = data["occurrences"]
+    occurrence_words = list(occurrences)
+    postings = array(OCCURRENCES_TYPECODE)
+    for awd in occurrence_words:
+        postings.extend(occurrences[awd])
+    counts_dict = data["counts_dict"]
+    return {
+        "prioritised_list": data["prioritised_list"],
+        "vocab": {"words": data["vocab"].words, "counts": data["vocab"].counts.tolist()},
+        "counts_dict": {"counts": dict(counts_dict.counts), "unk_cutoff": counts_dict.cutoff, "unk_label": counts_dict.unk_label},
+        "neighbours": data["neighbours"],
+        "neighbours_complete": data["neighbours_complete"],
+        "occurrences": {
+            "typecode": OCCURRENCES_TYPECODE,
+            "itemsize": postings.itemsize,
+            "byteorder": sys.byteorder,
+            "words": occurrence_words,
+            "lengths": [len(occurrences[awd]) for awd in occurrence_words],
+            "postings": base64.b64encode(postings.tobytes()).decode("ascii"),
+        },
+        "file_names": data["file_names"],
+        "file_stamps": data["file_stamps"],
+        "file_counts": data["file_counts"],
+    }
+
+
+def decode_snapshot_data(stored):
+    """
+    Rebuild the data of a prepared corpus from the dictionary of encode_snapshot_data.
+    Raises ValueError if the arrays were stored with a different item layout.
+    """
+    stored_occurrences = stored["occurrences"]
+    postings = array(stored_occurrences["typecode"])
+    if postings.itemsize != stored_occurrences["itemsize"] or sys.byteorder != stored_occurrences["byteorder"]:
+        raise ValueError("the occurrence index was stored with a different item size or byte order")
+    postings.frombytes(base64.b64decode(stored_occurrences["postings"]))
+    occurrences = {}
+    aidx = 0
+    for awd, alength in zip(stored_occurrences["words"], stored_occurrences["lengths"]):
+        occurrences[awd] = postings[aidx:aidx + alength]
+        aidx += alength
+    if aidx != len(postings):
+        raise ValueError("the occurrence index does not match its word types")
+
+    stored_counts = stored["counts_dict"]
+    counts_dict = CountVocabulary(unk_cutoff=stored_counts["unk_cutoff"], unk_label=stored_counts["unk_label"])
+    counts_dict.update(stored_counts["counts"])
+    neighbours = stored["neighbours"]
+    if neighbours is not None:
+        neighbours = {awd: [tuple(amatch) for amatch in matches] for awd, matches in neighbours.items()}
+    return {
+        "prioritised_list": stored["prioritised_list"],
+        "vocab": TypeVocabulary(stored["vocab"]["words"], stored["vocab"]["counts"]),
+        "counts_dict": counts_dict,
+        "neighbours": neighbours,
+        "neighbours_complete": stored["neighbours_complete"],
+        "occurrences": occurrences,
+        "file_names": stored["file_names"],
+        "file_stamps": {afn: tuple(astamp) for afn, astamp in stored["file_stamps"].items()},
+        "file_counts": stored["file_counts"],
+    }
+
+
+def save_snapshot(snapshot_fn, snapshot_key, data):
+    """
+    Write the data to the snapshot file. The file is written to a temporary
+    file first and then renamed, so that an interrupted write never leaves a
+    truncated snapshot behind. The snapshot keeps the permissions of the one it
+    replaces, so that sessions and exports run by other accounts can load it.
+    """
+    payload = json.dumps(encode_snapshot_data(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header = SNAPSHOT_MAGIC + "{}\n{}\n".format(snapshot_key, hashlib.sha256(payload).hexdigest()).encode("ascii")
+
+    with open_atomically(snapshot_fn) as fid:
+        fid.write(header)
+        fid.write(payload)
+
+
+def load_snapshot(snapshot_fn, snapshot_key):
+    """
+    Load the data from the snapshot file. Returns None if there is no snapshot,
+    if it was made for different settings, or if it is corrupt.
+    """
+    try:
+        with open(snapshot_fn, "rb") as fid:
+            if fid.readline() != SNAPSHOT_MAGIC:
+                logging.info("Ignoring snapshot {}: not a snapshot file.".format(snapshot_fn))
+                return None
+            stored_key = fid.readline().decode("ascii").strip()
+            if stored_key != snapshot_key:
+                logging.info("Ignoring snapshot {}: the settings changed.".format(snapshot_fn))
+                return None
+            stored_digest = fid.readline().decode("ascii").strip()
+            payload = fid.read()
+    except FileNotFoundError:
+        return None
+    except (OSError, UnicodeDecodeError) as error:
+        logging.info("Ignoring snapshot {}: {}".format(snapshot_fn, error))
+        return None
+
+    if hashlib.sha256(payload).hexdigest() != stored_digest:
+        logging.info("Ignoring snapshot {}: checksum mismatch.".format(snapshot_fn))
+        return None
+
+    try:
+        return decode_snapshot_data(json.loads(payload.decode("utf-8")))
+    except (ValueError, KeyError, TypeError, AttributeError) as error:
+        logging.info("Ignoring snapshot {}: {}".format(snapshot_fn, error))
+        return None
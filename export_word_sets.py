@@ -0,0 +1,281 @@
+"""
+Export the prioritised word sets of a corpus without the interactive menu of
+Lokisa Spell, e.g. as a nightly job on a server, so that they can be reviewed
+elsewhere.
+
+The corpus is prepared as in an interactive session, from the same snapshot if
+there is one, and the word sets are written in priority order. Every word type
+comes with its count, the correction choices that a session would offer for it
+(the matches of find_matches_faster, with their counts and ratios) and the
+locations of its occurrences. The interval and instance numbers start at 1, as
+in the log file and the journal.
+
+The output is JSON Lines, with one object per word set, or TSV, with one row per
+word type. It is written as the word sets are scored, and only a bounded number
+of chunks of word sets is scored ahead of the writer, so the memory use does not
+grow with the size of the export. With --jobs the matches are scored by a pool
+of worker processes. The output file only replaces an earlier one once it is
+complete.
+
+    python export_word_sets.py --output word_sets.jsonl --jobs 0
+    python export_word_sets.py --output word_sets.tsv --output_format tsv --num_word_sets 500
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import itertools
+import json
+import logging
+import os
+
+import lokisa
+import profiling
+from atomic_write import open_atomically
+from lokisa import PRIORITISED_LIST_RATIO_THRESHOLD, PRIORITISED_LIST_MAX_ALTERNATIVES, RATIO_THRESHOLD, MAX_ALTERNATIVES
+from similarity_index import SimilarityIndex
+
+TSV_COLUMNS = ["word_set", "word", "count", "priority", "alternatives", "occurrences"]
+
+
+def iter_word_set_chunks(prioritised_list, vocab, chunk_size, num_word_sets=0):
+    """
+    Yield the word sets of the prioritised list as lists of word types, chunk_size
+    word sets at a time. A lazy list is grouped as the chunks are taken. With
+    num_word_sets > 0 only the first num_word_sets word sets are yielded.
+    """
+    word_sets = iter(prioritised_list)
+    if num_word_sets > 0:
+        word_sets = itertools.islice(word_sets, num_word_sets)
+    while True:
+        chunk = [[vocab.words[wid] for wid in wordset] for wordset in itertools.islice(word_sets, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_scored_chunks(chunks, typeslist, num_alternatives=None, ratio_threshold=0.0, jobs=1):
+    """
+    Find the matches of every word type in the chunks of word sets and yield tuples
+    (chunk, matches) in the order of the chunks, where matches holds the list of
+    matches of every type of every word set. With jobs > 1 the chunks are scored by
+    a pool of worker processes, each with its own copy of the similarity index. At
+    most two chunks per worker are scored ahead of the caller, so that a slow writer
+    does not pile up results.
+    """
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=lokisa.init_neighbour_worker, initargs=(typeslist, ratio_threshold)) as executor:
+            pending = collections.deque()
+            for chunk in chunks:
+                words_chunk = [awd for words in chunk for awd in words]
+                pending.append((chunk, executor.submit(lokisa.find_matches_chunk, words_chunk, num_alternatives, ratio_threshold)))
+                if len(pending) >= jobs * 2:
+                    chunk, future = pending.popleft()
+                    yield chunk, split_by_word_set(chunk, future.result())
+            while pending:
+                chunk, future = pending.popleft()
+                yield chunk, split_by_word_set(chunk, future.result())
+    else:
+        simindex = SimilarityIndex(typeslist, ratio_threshold=ratio_threshold)
+        for chunk in chunks:
+            yield chunk, [[simindex.find_matches(awd, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold) for awd in words]
+                          for words in chunk]
+
+
+def split_by_word_set(chunk, words_matches):
+    """
+    Split the matches of all the word types of a chunk into a list per word set.
+    """
+    words_matches = iter(words_matches)
+    return [list(itertools.islice(words_matches, len(words))) for words in chunk]
+
+
+def make_word_set_record(set_number, words, matches, vocab, counts_dict, inputtext, max_occurrences=0):
+    """
+    Return the export record of a word set as a dictionary. With max_occurrences > 0
+    only the locations of the first max_occurrences occurrences of every type are listed.
+    """
+    records = []
+    for awd, word_matches in zip(words, matches):
+        occurrences = inputtext.iter_occurrences(awd)
+        if max_occurrences > 0:
+            occurrences = itertools.islice(occurrences, max_occurrences)
+        records.append({
+            "word": awd,
+            "count": counts_dict[awd],
+            "priority": vocab.priorities[vocab.get_id(awd)],
+            "alternatives": [{"word": bwd, "count": counts_dict[bwd], "ratio": levrat} for bwd, levrat in word_matches],
+            "occurrences": [{"file": afn, "interval": interval_count + 1, "instance": instance_count + 1}
+                            for afn, interval_count, instance_count in occurrences],
+        })
+    return {"word_set": set_number, "words": records}
+
+
+def format_tsv_rows(record):
+    """
+    Return the TSV lines of a word set record, one per word type. The alternatives are
+    given as word:ratio and the occurrences as file:interval:instance, separated by spaces
+    and by semicolons respectively.
+    """
+    lines = []
+    for aword in record["words"]:
+        alternatives = " ".join("{}:{:.4f}".format(aalt["word"], aalt["ratio"]) for aalt in aword["alternatives"])
+        occurrences = ";".join("{}:{}:{}".format(aocc["file"], aocc["interval"], aocc["instance"]) for aocc in aword["occurrences"])
+        lines.append("\t".join([str(record["word_set"]), aword["word"], str(aword["count"]), str(aword["priority"]), alternatives, occurrences]) + "\n")
+    return lines
+
+
+def export_word_sets(output_fn, inputtext, prioritised_list, vocab, counts_dict, output_format="jsonl", num_word_sets=0,
+                     max_occurrences=0, num_alternatives=None, ratio_threshold=0.0, chunk_size=256, jobs=1):
+    """
+    Score the word sets of the prioritised list and stream their records to output_fn.
+    The records are written to a temporary file that replaces output_fn once the export
+    is complete, so an interrupted export never leaves a truncated file behind, and the
+    export gets the permissions of the file that it replaces or of a new file.
+    Returns the number of word sets and the number of word types that were exported.
+    """
+    num_sets = 0
+    num_types = 0
+    with open_atomically(output_fn, "w", encoding="utf-8", newline="") as fid:
+        if output_format == "tsv":
+            fid.write("\t".join(TSV_COLUMNS) + "\n")
+        chunks = iter_word_set_chunks(prioritised_list, vocab, chunk_size, num_word_sets=num_word_sets)
+        for chunk, chunk_matches in iter_scored_chunks(chunks, vocab.words, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold, jobs=jobs):
+            for words, matches in zip(chunk, chunk_matches):
+                num_sets += 1
+                num_types += len(words)
+                record = make_word_set_record(num_sets, words, matches, vocab, counts_dict, inputtext, max_occurrences=max_occurrences)
+                if output_format == "tsv":
+                    fid.writelines(format_tsv_rows(record))
+                else:
+                    fid.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return num_sets, num_types
+
+
+def parse_command_line_arguments():
+    """Check the command line arguments."""
+    parser = argparse.ArgumentParser(description="Export the prioritised word sets of Lokisa Spell with their correction choices, counts and occurrences.")
+
+    parser.add_argument(
+        "--input_text_dir",
+        default="workingdir/textgrids",
+        help="Directory where the input text or textgrid files reside.",
+    )
+    parser.add_argument(
+        "--input_text_format",
+        choices=["plaintext", "textgrid"],
+        default="textgrid",
+        help="Format of the input text files.",
+    )
+    parser.add_argument(
+        "--mandatory_wordlist_fn",
+        help="File name of a text file that contains a list of words that are mandatory to handle.",
+    )
+    parser.add_argument(
+        "--output",
+        default="word_sets.jsonl",
+        help="File name of the export. Default is word_sets.jsonl",
+    )
+    parser.add_argument(
+        "--output_format",
+        choices=["jsonl", "tsv"],
+        default="jsonl",
+        help="JSON Lines with one word set per line, or TSV with one word type per row. Default is jsonl.",
+    )
+    parser.add_argument(
+        "--num_word_sets",
+        type=int,
+        default=0,
+        help="Number of word sets to export, from the top of the prioritised list. Use 0 for all of them. Default is 0.",
+    )
+    parser.add_argument(
+        "--max_occurrences",
+        type=int,
+        default=0,
+        help="Largest number of occurrence locations to list per word type. Use 0 for all of them. Default is 0.",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=256,
+        help="Number of word sets that a worker process scores at a time. Default is 256.",
+    )
+    parser.add_argument(
+        "--logdir",
+        default="log",
+        help="Directory where to store the log files. Default is log/",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes to use for parsing the input files, grouping the word types and scoring the matches. Use 0 for all the CPU cores. Default is 1.",
+    )
+    parser.add_argument(
+        "--snapshot_dir",
+        default="snapshots",
+        help="Directory where to store the snapshots of prepared corpora, shared with the interactive sessions. Default is snapshots/",
+    )
+    parser.add_argument(
+        "--no_snapshot",
+        action="store_true",
+        help="Do not load or save a snapshot of the prepared corpus.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record the wall time, CPU time and peak memory of every phase in the log file, and write their totals to profile_export_<date>.json in the log directory.",
+    )
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = parse_command_line_arguments()
+
+    logdir = args.logdir
+    os.makedirs(logdir, exist_ok=True)
+    datestr = datetime.datetime.now().strftime("%y%m%d_%H%M%S")
+
+    logging.basicConfig(**{
+        "filename": os.path.join(logdir, "export_{}.txt".format(datestr)),
+        "level": logging.INFO,
+        "format": "%(levelname)s:%(name)s:%(asctime)s:%(message)s"
+        })
+    logging.info("Starting the export of the word sets.")
+    if args.profile:
+        profiling.enable(summary_fn=os.path.join(logdir, "profile_export_{}.json".format(datestr)))
+
+    mandatory_wordlist = None
+    if args.mandatory_wordlist_fn:
+        mandatory_wordlist = lokisa.read_mandatory_wordlist(args.mandatory_wordlist_fn)
+
+    inputtext = lokisa.InputText(directory=args.input_text_dir, informat=args.input_text_format)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    snapshot_dir = None if args.no_snapshot else args.snapshot_dir
+    # Only a partial export groups the word sets on demand; a full one groups them all,
+    # with the neighbourhoods searched in parallel.
+    lazy = args.num_word_sets > 0
+
+    lokisa.log_and_print("Preparing the corpus in {}".format(args.input_text_dir))
+    with profiling.phase("prepare corpus"):
+        prioritised_list, vocab, counts_dict = lokisa.prepare_corpus(inputtext, mandatory_wordlist=mandatory_wordlist, num_alternatives=PRIORITISED_LIST_MAX_ALTERNATIVES, ratio_threshold=PRIORITISED_LIST_RATIO_THRESHOLD,
+                                                                     jobs=jobs, snapshot_dir=snapshot_dir, lazy=lazy)
+
+    # A partial export groups the word sets that it needs itself. The background grouping of the
+    # rest is stopped, also so that no thread runs while the worker processes are started.
+    prioritised_list.stop()
+
+    lokisa.log_and_print("Exporting the word sets to {}".format(args.output))
+    with profiling.phase("export word sets") as aphase:
+        num_sets, num_types = export_word_sets(args.output, inputtext, prioritised_list, vocab, counts_dict, output_format=args.output_format,
+                                               num_word_sets=args.num_word_sets, max_occurrences=args.max_occurrences, num_alternatives=MAX_ALTERNATIVES,
+                                               ratio_threshold=RATIO_THRESHOLD, chunk_size=args.chunk_size, jobs=jobs)
+        aphase.count = num_types
+    lokisa.log_and_print("Exported {} word sets with {} word types to {}".format(num_sets, num_types, args.output))
+
+
+if __name__ == "__main__":
+    main()
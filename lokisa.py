@@ -13,42 +13,151 @@ __date__ = "2020-09-29"
 import sys
 import os
 import glob
-import textgrid
-import Levenshtein
-from nltk.lm import Vocabulary
+import itertools
+import collections
+from array import array
+import concurrent.futures
+import threading
+import time
 import logging
 import datetime
 import argparse
-from tqdm import tqdm
 from pprint import pprint
 
+import textgrid_reader
+from similarity_index import SimilarityIndex, select_alternatives
+from corpus_snapshot import get_snapshot_fn, get_snapshot_key, load_snapshot, save_snapshot
+from change_journal import ChangeJournal
+from vocabulary import TypeVocabulary, CountVocabulary
+from prefetcher import WordSetPrefetcher
+from worker_chunks import split_into_chunks, get_worker_context
+import profiling
+
 import colorama
 colorama.init()
 
+# The settings of the prioritised list, of the correction choices and of the vocabulary search.
+# The prioritised list settings are part of the snapshot key, which export_word_sets.py shares.
+PRIORITISED_LIST_RATIO_THRESHOLD = 0.7
+PRIORITISED_LIST_MAX_ALTERNATIVES = 2
+RATIO_THRESHOLD = 0.7
+MAX_ALTERNATIVES = 4
+SEARCH_RATIO_THRESHOLD = 0.6
+SEARCH_MAX_ALTERNATIVES = 2
+
+
+def tqdm(*args, **kwargs):
+    """
+    Show a tqdm progress bar. tqdm is only imported when the first progress bar is
+    shown, since importing it takes long compared to the start of the program.
+    """
+    from tqdm import tqdm as tqdm_bar
+    return tqdm_bar(*args, **kwargs)
+
+class DocumentCache:
+    """
+    A least recently used cache of the split text of input files, i.e. a list with
+    the words of every interval or line. Entries are evicted when the approximate
+    memory use of the cache grows beyond max_bytes. Every entry is stored with the
+    (size, mtime) stamp of the file it was read from and is only returned for that
+    same stamp, so a modified file is read again.
+    """
+    def __init__(self, max_bytes=64*1024*1024):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.num_bytes = 0
+
+    @staticmethod
+    def get_size(text_out):
+        asize = sys.getsizeof(text_out)
+        for tg_words in text_out:
+            asize += sys.getsizeof(tg_words) + sum(sys.getsizeof(awd) for awd in tg_words)
+        return asize
+
+    def get(self, afn, astamp):
+        entry = self.entries.get(afn)
+        if entry is None:
+            return None
+        if entry[0] != astamp:
+            self.discard(afn)
+            return None
+        self.entries.move_to_end(afn)
+        return entry[2]
+
+    def put(self, afn, astamp, text_out):
+        self.discard(afn)
+        asize = self.get_size(text_out)
+        if asize > self.max_bytes:
+            return
+        self.entries[afn] = (astamp, asize, text_out)
+        self.num_bytes += asize
+        while self.num_bytes > self.max_bytes:
+            _, (_, old_size, _) = self.entries.popitem(last=False)
+            self.num_bytes -= old_size
+
+    def discard(self, afn):
+        entry = self.entries.pop(afn, None)
+        if entry is not None:
+            self.num_bytes -= entry[1]
+
+
 class InputText:
     """
     The InputText class handles some basic IO and provide utility functions
     for the input TextGrid or plain text files.
     """
-    def __init__(self, directory="workingdir/textgrids", informat="textgrid"):
+    def __init__(self, directory="workingdir/textgrids", informat="textgrid", document_cache_bytes=64*1024*1024):
         # Directory where the input text files reside.
         self.directory = directory
         # The format of the input text. Currently either textgrid or plaintext.
         self.informat = informat
-
+        # Inverted index from each word type to its occurrences in corpus order, as an
+        # array of integer triples (file_id, interval_or_line_count, instance_count).
+        self.occurrences = None
+        # File ID -> file name and file name -> file ID for the occurrence index.
+        self.file_names = []
+        self.file_ids = {}
+        # Changes whenever the occurrence index changes, so that worklists built from it can be checked.
+        self.index_version = 0
+        # Guards the occurrence index and the document cache, which a WordSetPrefetcher uses from its own thread.
+        self.lock = threading.RLock()
+        # The (size, mtime) stamp of each indexed file, and the count of each word type in it.
+        self.file_stamps = {}
+        self.file_counts = {}
+        # The detected encoding of each file, e.g. UTF-8 or UTF-16.
+        self.file_encodings = {}
+        # Cache of the split text of recently viewed files for get_sentence_at.
+        self.document_cache = DocumentCache(max_bytes=document_cache_bytes)
+
+
+    def get_file_encoding(self, afn):
+        """
+        Return the encoding of a file, detecting it from the first bytes of the file
+        the first time that it is asked for.
+        """
+        encoding = self.file_encodings.get(afn)
+        if encoding is None:
+            with open(afn, "rb") as fid:
+                encoding = textgrid_reader.detect_encoding(fid.read(64))
+            self.file_encodings[afn] = encoding
+        return encoding
 
     def get_textgrid_text(self, atgfn, do_split=False):
-        tg = textgrid.TextGrid.fromFile(atgfn)
+        text, self.file_encodings[atgfn] = textgrid_reader.read_textgrid(atgfn, encoding=self.file_encodings.get(atgfn))
+        marks = [aitem.mark for aitem in textgrid_reader.read_tier_items(text, tier_index=0)]
 
         if do_split:
-            textout = [interval.mark.strip().split() for interval in tg[0]]
+            textout = [amark.strip().split() for amark in marks]
         else:
-            textout = [interval.mark.strip() for interval in tg[0]]
+            textout = [amark.strip() for amark in marks]
 
         return textout
 
     def get_plaintext_text(self, atfn, do_split=False):
-        with open(atfn, "r") as fid:
+        with open(atfn, "r", encoding=self.get_file_encoding(atfn)) as fid:
+            # Skip the byte order mark, if there is one.
+            if fid.read(1) != "\ufeff":
+                fid.seek(0)
             if do_split:
                 textout = [aline.strip().split() for aline in fid if aline != ""]
             else:
@@ -56,82 +165,256 @@ class InputText:
 
         return textout
 
+    def get_file_text(self, afn, do_split=False):
+        if self.informat == "textgrid":
+            return self.get_textgrid_text(afn, do_split=do_split)
+        elif self.informat == "plaintext":
+            return self.get_plaintext_text(afn, do_split=do_split)
 
-    def get_text_all(self, do_split=False):
+    def get_file_list(self):
         """
-        Find all the TextGrid files in the given directory and read in all the
-        annotations. Return the annotations as a list of text string.
+        Return the sorted list of all the input files in the given directory.
         """
-
         if self.informat == "textgrid":
             globpat = "**/*.TextGrid"
-            fun_get_text = self.get_textgrid_text
         elif self.informat == "plaintext":
             globpat = "**/*.txt"
-            fun_get_text = self.get_plaintext_text
 
         fn_list = glob.glob(os.path.join(self.directory, globpat), recursive=True)
         fn_list.sort()
 
-        text_list = []
-        for afn in tqdm(fn_list):
-            text_list.extend(fun_get_text(afn, do_split=do_split))
+        return fn_list
 
-        return text_list
+    def get_file_stamps(self):
+        """
+        Return the (size, mtime) stamps of all the input files in a dictionary with the file name as key.
+        """
+        return {afn: self.get_file_stamp(afn) for afn in self.get_file_list()}
 
-    def get_sentence_at(self, afn, interval_or_line_count):
+    @staticmethod
+    def get_file_stamp(afn):
+        astat = os.stat(afn)
+        return (astat.st_size, astat.st_mtime_ns)
 
-        if self.informat == "textgrid":
-            tg = textgrid.TextGrid.fromFile(afn)
-            interval =  tg[0][interval_or_line_count]
-            tg_words = interval.mark.strip().split()
-            return tg_words
 
-        elif self.informat == "plaintext":
-            with open(afn, "r") as fid:
-                for icnt, aline in enumerate(fid):
-                    if icnt == interval_or_line_count:
-                        return aline.strip().split()
+    def iter_file_texts(self, fn_list, do_split=False, jobs=1):
+        """
+        Read the given files and yield tuples (file_name, file_stamp, text) in the
+        order of fn_list. With jobs > 1 the files are read in chunks by a pool of
+        worker processes.
+        """
+        if jobs > 1 and len(fn_list) > 1:
+            fn_chunks = split_into_chunks(fn_list, jobs)
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                chunk_results = executor.map(read_input_files, itertools.repeat(self.directory), itertools.repeat(self.informat),
+                                             fn_chunks, itertools.repeat(do_split))
+                with tqdm(total=len(fn_list)) as pbar:
+                    for file_texts in chunk_results:
+                        for afn, astamp, text_out in file_texts:
+                            yield afn, astamp, text_out
+                        pbar.update(len(file_texts))
+        else:
+            for afn in tqdm(fn_list):
+                astamp = self.get_file_stamp(afn)
+                yield afn, astamp, self.get_file_text(afn, do_split=do_split)
 
 
-    def build_worklist(self, focus_word):
-        if self.informat == "textgrid":
+    def clear_occurrence_index(self):
+        self.index_version += 1
+        self.occurrences = {}
+        self.file_names = []
+        self.file_ids = {}
+        self.file_stamps = {}
+        self.file_counts = {}
 
-            atgfn_list = glob.glob(os.path.join(self.directory, "**/*.TextGrid"), recursive=True)
-            atgfn_list.sort()
+    def get_file_id(self, afn):
+        """
+        Return the integer ID of a file in the occurrence index, giving it a new one
+        if it has none yet.
+        """
+        fid = self.file_ids.get(afn)
+        if fid is None:
+            fid = len(self.file_names)
+            self.file_names.append(afn)
+            self.file_ids[afn] = fid
+        return fid
+
+    def iter_text_all(self, do_split=False, jobs=1):
+        """
+        Find all the input files in the given directory and yield their annotations
+        one interval or line at a time, so that the whole corpus is never held in
+        memory. The occurrence index is built in the same pass.
+        """
+        fn_list = self.get_file_list()
 
-            # First draw up a list of all the occurrences in all the textgrids so that we can
-            # traverse them if required
-            worklist = []
-            occ_cnt = 0
-            for atgfn in tqdm(atgfn_list):
-                tg = textgrid.TextGrid.fromFile(atgfn)
-                for icnt in range(len(tg[0])):
-                    interval =  tg[0][icnt]
-                    tg_words = interval.mark.strip().split()
-                    for icount in range(tg_words.count(focus_word)):
-                        worklist.append((occ_cnt, atgfn, icnt, icount))
-                        occ_cnt += 1
-
-            return worklist
+        self.clear_occurrence_index()
+        for afn, astamp, text_out in self.iter_file_texts(fn_list, do_split=do_split, jobs=jobs):
+            self.index_file(afn, astamp, text_out, is_split=do_split)
+            for aline in text_out:
+                yield aline
 
-        elif self.informat == "plaintext":
-            atgfn_list = glob.glob(os.path.join(self.directory, "**/*.txt"), recursive=True)
-            atgfn_list.sort()
+    def get_text_all(self, do_split=False, jobs=1):
+        """
+        Find all the TextGrid files in the given directory and read in all the
+        annotations. Return the annotations as a list of text string.
+        The occurrence index is built in the same pass. With jobs > 1 the files
+        are parsed in parallel, but the result is the same as that of a serial run.
+        """
+        return list(self.iter_text_all(do_split=do_split, jobs=jobs))
+
+    def index_all(self, jobs=1):
+        """
+        Build the occurrence index and the word counts of every file without
+        keeping the text of the corpus in memory.
+        """
+        fn_list = self.get_file_list()
+
+        self.clear_occurrence_index()
+        for afn, astamp, text_out in self.iter_file_texts(fn_list, do_split=True, jobs=jobs):
+            self.index_file(afn, astamp, text_out, is_split=True)
+
+    def index_file(self, afn, astamp, text_out, is_split=False):
+        """
+        Add the occurrences of all the words in a file to the occurrence index.
+        Returns a dictionary with the count of each word type in the file.
+        """
+        file_counts = {}
+        fid = self.get_file_id(afn)
+        for icnt, aline in enumerate(text_out):
+            tg_words = aline if is_split else aline.split()
+            instance_counts = {}
+            for awd in tg_words:
+                icount = instance_counts.get(awd, 0)
+                instance_counts[awd] = icount + 1
+                postings = self.occurrences.get(awd)
+                if postings is None:
+                    postings = self.occurrences[awd] = array("i")
+                postings.extend((fid, icnt, icount))
+            for awd, icount in instance_counts.items():
+                file_counts[awd] = file_counts.get(awd, 0) + icount
+
+        self.file_stamps[afn] = astamp
+        self.file_counts[afn] = file_counts
+        return file_counts
+
+    def unindex_file(self, afn):
+        """
+        Remove the occurrences in a file from the occurrence index.
+        Returns a dictionary with the count of each word type that was in the file.
+        """
+        file_counts = self.file_counts.pop(afn, {})
+        self.file_stamps.pop(afn, None)
+        self.file_encodings.pop(afn, None)
+        self.document_cache.discard(afn)
+        # The file keeps its ID, so that it gets the same one if it is indexed again.
+        fid = self.file_ids.get(afn)
+        for awd in file_counts:
+            old_postings = self.occurrences[awd]
+            postings = array("i")
+            for aidx in range(0, len(old_postings), 3):
+                if old_postings[aidx] != fid:
+                    postings.extend(old_postings[aidx:aidx+3])
+            if postings:
+                self.occurrences[awd] = postings
+            else:
+                del self.occurrences[awd]
+        return file_counts
+
+    def refresh_occurrence_index(self, jobs=1):
+        """
+        Bring the occurrence index up to date with the files on disk. Only
+        files that were added, removed or modified since they were indexed are
+        read. Returns a list with a tuple (file_name, old_counts, new_counts)
+        for every file that changed, where the counts are dictionaries with
+        the count of each word type in the file before and after the change.
+        """
+        with self.lock:
+            if self.occurrences is None:
+                self.clear_occurrence_index()
+
+            fn_list = self.get_file_list()
+            fn_set = set(fn_list)
+            changes = []
+            for afn in [afn for afn in self.file_stamps if afn not in fn_set]:
+                changes.append((afn, self.unindex_file(afn), {}))
+
+            changed_fn_list = [afn for afn in fn_list if self.file_stamps.get(afn) != self.get_file_stamp(afn)]
+            if changed_fn_list:
+                touched_types = set()
+                for afn, astamp, text_out in self.iter_file_texts(changed_fn_list, jobs=jobs):
+                    old_counts = self.unindex_file(afn)
+                    new_counts = self.index_file(afn, astamp, text_out)
+                    touched_types.update(old_counts)
+                    touched_types.update(new_counts)
+                    changes.append((afn, old_counts, new_counts))
+
+                # Files that are indexed out of turn append their postings at the end, so restore the corpus order.
+                file_names = self.file_names
+                for awd in touched_types:
+                    postings = self.occurrences.get(awd)
+                    if postings is not None:
+                        triples = sorted(zip(postings[0::3], postings[1::3], postings[2::3]), key=lambda xx: (file_names[xx[0]], xx[1], xx[2]))
+                        self.occurrences[awd] = array("i", [avalue for atriple in triples for avalue in atriple])
+
+            if changes:
+                self.index_version += 1
+            return changes
+
+    def get_sentence_at(self, afn, interval_or_line_count):
+        """
+        Return the words of the given interval or line of a file, or None if the file
+        no longer has that interval or line. The split text of recently used files is
+        kept in the document cache. The stamp that the occurrence index recorded for the
+        file tells whether the cached text is still current, so stepping through a
+        worklist does not touch the disk.
+        """
+        with self.lock:
+            astamp = self.file_stamps.get(afn)
+            if astamp is None:
+                astamp = self.get_file_stamp(afn)
+            text_out = self.document_cache.get(afn, astamp)
+            if text_out is None:
+                text_out = self.get_file_text(afn, do_split=True)
+                self.document_cache.put(afn, astamp, text_out)
+
+        if interval_or_line_count < len(text_out):
+            return text_out[interval_or_line_count]
+        return None
+
+    def build_worklist(self, focus_word):
+        """
+        Draw up a list of all the occurrences of the focus word in all the input files
+        so that we can traverse them if required. The list items are tuples
+        (occurrence_count, file_name, interval_or_line_count, instance_count).
+        """
+        with self.lock:
+            self.refresh_occurrence_index()
 
-            # First draw up a list of all the occurrences in all the text files so that we can
-            # traverse them if required
             worklist = []
-            occ_cnt = 0
-            for atgfn in tqdm(atgfn_list):
-                with open(atgfn, "r") as fid:
-                    for icnt, aline in enumerate(fid):
-                        tg_words = aline.strip().split()
-                        for icount in range(tg_words.count(focus_word)):
-                            worklist.append((occ_cnt, atgfn, icnt, icount))
-                            occ_cnt += 1
+            for occ_cnt, (afn, interval_count, instance_count) in enumerate(self.iter_occurrences(focus_word)):
+                worklist.append((occ_cnt, afn, interval_count, instance_count))
+
+        return worklist
+
+    def iter_occurrences(self, focus_word):
+        """
+        Yield the occurrences of a word in corpus order as tuples (file_name,
+        interval_or_line_count, instance_count), as the occurrence index has them,
+        i.e. without checking the files for changes first.
+        """
+        postings = self.occurrences.get(focus_word, ())
+        file_names = self.file_names
+        for aidx in range(0, len(postings), 3):
+            yield file_names[postings[aidx]], postings[aidx+1], postings[aidx+2]
+
+def read_input_files(directory, informat, fn_chunk, do_split=False):
+    """
+    Read a chunk of input files in a worker process.
+    Returns a list with tuples (file_name, file_stamp, text).
+    """
+    inputtext = InputText(directory=directory, informat=informat)
+    return [(afn, inputtext.get_file_stamp(afn), inputtext.get_file_text(afn, do_split=do_split)) for afn in fn_chunk]
 
-            return worklist
 
 def log_and_print(message):
     print(message)
@@ -162,11 +445,49 @@ def parse_command_line_arguments():
         default="log",
         help="Directory where to store the log files. Default is log/",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes to use for parsing the input files and for grouping the word types. Use 0 for all the CPU cores. Default is 1.",
+    )
+    parser.add_argument(
+        "--document_cache_mb",
+        type=int,
+        default=64,
+        help="Memory in MB to use for caching the text of recently viewed files. Default is 64.",
+    )
+    parser.add_argument(
+        "--snapshot_dir",
+        default="snapshots",
+        help="Directory where to store the snapshots of prepared corpora that speed up the next start. Default is snapshots/",
+    )
+    parser.add_argument(
+        "--no_snapshot",
+        action="store_true",
+        help="Do not load or save a snapshot of the prepared corpus.",
+    )
+    parser.add_argument(
+        "--prefetch_word_sets",
+        type=int,
+        default=3,
+        help="Number of word sets after the current one whose matches, worklists and sentences are prepared in the background while the main menu is shown. Use -1 to turn prefetching off. Default is 3.",
+    )
     parser.add_argument(
         "--debug",
         action="store_true",
         help="Activate a debug mode.",
     )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record the wall time, CPU time, peak memory and item counts of every phase and of every match lookup, worklist build and sentence fetch in the log file, and write their totals to profile_<date>.json in the log directory.",
+    )
+    parser.add_argument(
+        "--profile_grouping",
+        action="store_true",
+        help="With --profile, also save a cProfile dump of the grouping of the word sets to profile_<date>_grouping.prof in the log directory.",
+    )
 
     #if len(sys.argv) == 1:
     #    parser.print_help()
@@ -175,45 +496,72 @@ def parse_command_line_arguments():
     return parser.parse_args()
 
 
+def read_mandatory_wordlist(wordlist_fn):
+    """
+    Load the words from the mandatory word list file, skipping the comment lines that start with #.
+    """
+    with open(wordlist_fn, "r") as fid:
+        return [awd.strip() for awd in fid if not awd.startswith('#')]
+
+
 def find_matches_faster(inword, wordlist, num_alternatives=None, ratio_threshold=0.0):
     """
     Use Levenshtein to find match word with closely matching spellings.
     Returns a list with tuples (word_label, Levenshtein_ratio)
     """
+    import Levenshtein
 
     # Sort according to the ratio.
     match_ratios = sorted([(awd, Levenshtein.ratio(inword, awd)) for awd in wordlist], reverse=True, key=lambda xx: xx[1])
 
-    if not match_ratios:
-        return []
+    return select_alternatives(match_ratios, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
 
-    # Discard the first match which is the query word itself.
-    if match_ratios[0][1] == 1.0:
-        match_ratios = match_ratios[1:]
 
-    if ratio_threshold > 0.0:
-        match_ratios = [(awd, levrat) for awd, levrat in match_ratios if levrat >= ratio_threshold]
+def get_token_filter(
+        remove_fra=True,
+        remove_ara=True,
+        remove_eng=True,
+        remove_misses=True,
+        remove_junk=True,
+        remove_fillers=True
+        ):
+    """
+    Return a function that tells whether a word token should be kept
+    given the 'remove_' cleanup options.
+    """
+    removes = []
+    if remove_fra:
+        removes += ['_fra']
+    if remove_ara:
+        removes += ['_ara']
+    if remove_eng:
+        removes += ['_eng']
+    removes = tuple(removes)
 
-    # Get the set of ratios
-    ratios_list = sorted(list(set([arat for awd, arat in match_ratios])), reverse=True)
+    def keep_token(awd):
+        if removes and awd.endswith(removes):
+            return False
+        if remove_misses and '[' in awd and ']' in awd:
+            return False
+        if remove_junk and 'JUNK' == awd:
+            return False
+        if remove_fillers and awd.startswith("<fil>"):
+            return False
+        return True
 
-    # Pick from the highest ratios until we have the required number of alternatives
-    match_ratios_new = []
+    return keep_token
 
-    if num_alternatives:
-        if len(ratios_list) <= num_alternatives:
-            match_ratios_new = match_ratios
-        else:
-            ratio_cmp = ratios_list[num_alternatives-1]
-            for amatch in match_ratios:
-                if amatch[1] >= ratio_cmp:
-                    match_ratios_new.append(amatch)
-                else:
-                    break
-    else:
-        match_ratios_new = match_ratios
 
-    return match_ratios_new
+def iter_tokens(inlines, keep_token=None):
+    """
+    Split each line of text into words and yield the word tokens that
+    pass the token filter, one at a time.
+    """
+    if keep_token is None:
+        keep_token = get_token_filter()
+
+    for aline in inlines:
+        yield from [awd for awd in aline.strip().split() if keep_token(awd)]
 
 
 def split_list(
@@ -231,37 +579,65 @@ def split_list(
     Also performs some cleanup for the given 'remove_' options.
     Returns a list of all the word tokens.
     """
-    removes = []
-    if remove_fra:
-        removes += ['_fra']
-    if remove_ara:
-        removes += ['_ara']
-    if remove_eng:
-        removes += ['_eng']
-    removes = tuple(removes)
-    tokenlist = []
-
-    for aline in tqdm(inlist):
-        awrdlist = aline.strip().split()
-        if removes:
-            awrdlist = [awd for awd in awrdlist if not awd.endswith(removes)]
-        if remove_misses:
-            awrdlist = [awd for awd in awrdlist if '[' not in awd or ']' not in awd]
-        if remove_junk:
-            awrdlist = [awd for awd in awrdlist if 'JUNK' != awd]
-        if remove_fillers:
-            awrdlist = [awd for awd in awrdlist if not awd.startswith("<fil>")]
-        tokenlist.extend(awrdlist)
-
-    return tokenlist
+    keep_token = get_token_filter(remove_fra, remove_ara, remove_eng, remove_misses, remove_junk, remove_fillers)
+
+    return list(iter_tokens(tqdm(inlist), keep_token=keep_token))
+
+
+def count_file_tokens(file_counts_list, keep_token=None):
+    """
+    Add up the word counts of each file, as kept by the occurrence index,
+    for the word tokens that pass the token filter.
+    Returns a Counter with the word type as key and the count as value.
+    """
+    if keep_token is None:
+        keep_token = get_token_filter()
+
+    token_counts = collections.Counter()
+    for file_counts in file_counts_list:
+        token_counts.update({awd: acount for awd, acount in file_counts.items() if keep_token(awd)})
+
+    return token_counts
 
 def get_token_counts(tokenlist, greater_than=0):
     """
     Calculate the occurrence counts of each word type given the full list of word tokens.
-    The counts are return as a dictionary where the key is the word type and the value is the count.
+    The tokens may also be given as any iterable, e.g. a generator from iter_tokens, or as
+    a Counter with the count of each word type, so that they need not all be held in memory.
+    The counts are return as a CountVocabulary, which can be used like a dictionary where the key is
+    the word type and the value is the count.
     """
     # The slow way of counting:  {awty: tokenlist.count(awty) for awty in tqdm(typeslist) if tokenlist.count(awty) > greater_than}
-    return Vocabulary(tokenlist, unk_cutoff=greater_than + 1)
+    return CountVocabulary(tokenlist, unk_cutoff=greater_than + 1)
+
+
+def update_token_counts(counts_dict, file_changes, keep_token):
+    """
+    Update the token counts for the changed files in place by subtracting the
+    old token counts of each file and adding the new ones. The file changes are
+    the tuples (file_name, old_counts, new_counts) from refresh_occurrence_index.
+    Returns True if any of the counts changed.
+    """
+    delta = collections.Counter()
+    for afn, old_counts, new_counts in file_changes:
+        for awd, acount in old_counts.items():
+            if keep_token(awd):
+                delta[awd] -= acount
+        for awd, acount in new_counts.items():
+            if keep_token(awd):
+                delta[awd] += acount
+
+    delta = {awd: acount for awd, acount in delta.items() if acount != 0}
+    if not delta:
+        return False
+
+    counts_dict.counts.update(delta)
+    for awd in delta:
+        if counts_dict.counts[awd] <= 0:
+            del counts_dict.counts[awd]
+    # Let the vocabulary recalculate its size.
+    counts_dict.update()
+    return True
 
 
 def get_word_lengths(awlist, greater_than=0, mandatory_wordlist=None):
@@ -270,14 +646,106 @@ def get_word_lengths(awlist, greater_than=0, mandatory_wordlist=None):
     as a dictionary, where the key is the word type and the value is the length.
     """
     if mandatory_wordlist:
-        len_dict = {awd: len(awd) for awd in tqdm(awlist) if (len(awd) > greater_than) or (awd in mandatory_wordlist)}
+        mandatory_set = set(mandatory_wordlist)
+        len_dict = {awd: len(awd) for awd in tqdm(awlist) if (len(awd) > greater_than) or (awd in mandatory_set)}
     else:
         len_dict = {awd: len(awd) for awd in tqdm(awlist) if len(awd) > greater_than}
 
     return len_dict
 
 
-def get_prioritised_list(tokenlist, get_topN=100, mandatory_wordlist=None, num_alternatives=None, ratio_threshold=0.0):
+# The similarity index of a worker process of get_word_neighbours, or of another pool that searches the vocabulary.
+_worker_simindex = None
+
+
+def init_neighbour_worker(typeslist, ratio_threshold):
+    """
+    Build the similarity index once in every worker process of get_word_neighbours,
+    or of another pool that runs find_neighbour_chunk or find_matches_chunk.
+    """
+    global _worker_simindex
+    _worker_simindex = SimilarityIndex(typeslist, ratio_threshold=ratio_threshold)
+
+
+def find_neighbour_chunk(types_chunk, ratio_threshold):
+    """
+    Find the neighbourhoods of a chunk of word types in a worker process.
+    Returns a list with the neighbourhood of every type in the chunk.
+    """
+    return [[amatch for amatch in _worker_simindex.threshold_matches(awd, ratio_threshold) if amatch[0] != awd] for awd in types_chunk]
+
+
+def find_matches_chunk(words_chunk, num_alternatives=None, ratio_threshold=0.0):
+    """
+    Find the closest matches of a chunk of word types in a worker process, as
+    find_matches_faster would. Returns a list with the matches of every type in the chunk.
+    """
+    return [_worker_simindex.find_matches(awd, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold) for awd in words_chunk]
+
+
+def search_word_neighbours(typeslist, search_types, ratio_threshold, jobs=1):
+    """
+    Find the neighbourhoods of the word types in search_types within the
+    vocabulary typeslist. With jobs > 1 the neighbourhoods are searched in
+    chunks by a pool of worker processes, each with its own copy of the
+    similarity index.
+    Returns a dictionary with the word type as key and its neighbourhood as value.
+    """
+    neighbours = {}
+    if jobs > 1 and len(search_types) > 1:
+        types_chunks = split_into_chunks(search_types, jobs)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=init_neighbour_worker, initargs=(typeslist, ratio_threshold)) as executor:
+            chunk_results = executor.map(find_neighbour_chunk, types_chunks, itertools.repeat(ratio_threshold))
+            with tqdm(total=len(search_types)) as pbar:
+                for types_chunk, chunk_neighbours in zip(types_chunks, chunk_results):
+                    neighbours.update(zip(types_chunk, chunk_neighbours))
+                    pbar.update(len(types_chunk))
+    elif search_types:
+        simindex = SimilarityIndex(typeslist, ratio_threshold=ratio_threshold)
+        for awd in tqdm(search_types):
+            neighbours[awd] = [amatch for amatch in simindex.threshold_matches(awd, ratio_threshold) if amatch[0] != awd]
+    return neighbours
+
+
+def get_word_neighbours(typeslist, ratio_threshold, neighbours=None, jobs=1):
+    """
+    Find the neighbourhood of every word type, i.e. the other types with a
+    Levenshtein ratio of at least ratio_threshold. A neighbourhood is a list
+    with tuples (word_label, Levenshtein_ratio) sorted from the highest to the
+    lowest ratio, with ties in the order of the types list.
+    The neighbourhoods of an earlier version of the vocabulary can be passed
+    in. Then only the new types are searched for, and the other neighbourhoods
+    are updated for the types that were added or removed.
+    With jobs > 1 the neighbourhoods are searched in parallel.
+    Returns a dictionary with the word type as key and its neighbourhood as value.
+    """
+    typesset = set(typeslist)
+
+    if neighbours is None:
+        neighbours = {}
+    else:
+        neighbours = {awd: [amatch for amatch in matches if amatch[0] in typesset] for awd, matches in neighbours.items() if awd in typesset}
+
+    new_types = [awd for awd in typeslist if awd not in neighbours]
+    neighbours.update(search_word_neighbours(typeslist, new_types, ratio_threshold, jobs=jobs))
+
+    # The ratio is symmetric, so a new type also joins the neighbourhoods of its neighbours.
+    if len(new_types) < len(typeslist):
+        new_types = set(new_types)
+        touched_types = set()
+        for awd in new_types:
+            for bwd, levrat in neighbours[awd]:
+                if bwd not in new_types:
+                    neighbours[bwd].append((awd, levrat))
+                    touched_types.add(bwd)
+        word_rank = {awd: aidx for aidx, awd in enumerate(typeslist)}
+        for bwd in touched_types:
+            neighbours[bwd].sort(key=lambda xx: (-xx[1], word_rank[xx[0]]))
+
+    return neighbours
+
+
+def get_prioritised_list(tokenlist, get_topN=100, mandatory_wordlist=None, num_alternatives=None, ratio_threshold=0.0, jobs=1):
     """
     Build a prioritised list of word types that should be considered for
     checking. The top N (default N=100) word types are returned.
@@ -287,48 +755,437 @@ def get_prioritised_list(tokenlist, get_topN=100, mandatory_wordlist=None, num_a
 
     log_and_print("Calculating occurrence counts.")
     counts_dict = get_token_counts(tokenlist)
-    log_and_print("Calculating word lengths.")
-    len_dict = get_word_lengths(sorted([awd for awd in counts_dict if awd != "<UNK>"]), greater_than=4, mandatory_wordlist=mandatory_wordlist)
-    typeslist = sorted(list(len_dict.keys()))
+    prioritised_list, vocab, _ = prioritise_word_types(counts_dict, mandatory_wordlist=mandatory_wordlist, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold, jobs=jobs)
+    combined_list2 = [vocab.entries(wordset) for wordset in prioritised_list]
 
-    combined_list = sorted([(alen, awd, counts_dict[awd], alen + counts_dict[awd]) for awd, alen in len_dict.items()], key=lambda xx: xx[1])
-    combined_list = sorted(combined_list, key=lambda xx: xx[3], reverse=True)
+    return combined_list2, vocab.words, counts_dict
 
-    # Move/add mandatory words to the top of the list.
+
+def prioritise_word_types(counts_dict, mandatory_wordlist=None, num_alternatives=None, ratio_threshold=0.0, neighbours=None, jobs=1, lazy=False, searched_neighbours=None):
+    """
+    Group the counted word types into the prioritised list of word sets.
+    Neighbourhoods from get_word_neighbours for an earlier version of the
+    vocabulary can be passed in to avoid searching them again. With jobs > 1
+    the neighbourhoods are searched in parallel; the grouping itself is a
+    sequential pass over them, so the word sets are the same.
+    With lazy=True the word sets are only grouped when they are asked for, and
+    without neighbours from an earlier vocabulary only the neighbourhoods that
+    the grouping reaches are searched; PrioritisedList.start_extending searches
+    the rest in parallel. searched_neighbours can hold the ones that an earlier
+    lazy grouping of the same vocabulary searched.
+    Returns the PrioritisedList, where every word set is a list of type IDs,
+    the TypeVocabulary of the types and the neighbourhoods (None if
+    ratio_threshold is zero).
+    """
+    log_and_print("Calculating word lengths.")
+    with profiling.phase("word lengths") as aphase:
+        len_dict = get_word_lengths(sorted([awd for awd in counts_dict if awd != "<UNK>"]), greater_than=4, mandatory_wordlist=mandatory_wordlist)
+        typeslist = sorted(list(len_dict.keys()))
+        vocab = TypeVocabulary(typeslist, [counts_dict[awd] for awd in typeslist])
+        aphase.count = len(vocab)
+
+    # Mandatory words go to the top of the list, in the order of the mandatory word list.
+    mandatory_rank = {}
     if mandatory_wordlist:
         for amanwd in reversed(mandatory_wordlist):
-            if amanwd in typeslist:
-                # If a mandatory word is already in the combined list, move it to the top
-                for aidx, atuple in enumerate(combined_list):
-                    alen, awd, count_val, priority_val = atuple
-                    if awd == amanwd:
-                        combined_list.insert(0, combined_list.pop(aidx))
-                        break
-            else:
+            if amanwd not in vocab:
                 # If a mandatory word is not in the corpus, what do we do?
                 print("The mandatory word,", amanwd,", does not occur in the corpus. Ignoring it.")
+        for aidx, amanwd in enumerate(mandatory_wordlist):
+            if amanwd in vocab:
+                mandatory_rank.setdefault(vocab.get_id(amanwd), aidx)
+
+    # Sort by the priority score, with ties in alphabetical order (i.e. by ID), after the mandatory words.
+    num_mandatory = len(mandatory_wordlist) if mandatory_wordlist else 0
+    priorities = vocab.priorities
+    with profiling.phase("priority order") as aphase:
+        combined_list = sorted(range(len(vocab)), key=lambda wid: (mandatory_rank.get(wid, num_mandatory), -priorities[wid], wid))
+        aphase.count = len(combined_list)
 
     # Refine the list by grouping together the closest Levenshtein matches to form "word sets" for checking and editing.
     log_and_print("Refining the prioritised word list.")
-    combined_list2 = []
-    # Make a copy of the types list that we will prune as we iterate the loop. The idea is to make the loop faster
-    # as we progress, since the typelist search space becomes smaller.
-    typeslist2 = list(typeslist)
-    for alen, awd, count_val, priority_val in tqdm(combined_list):
-        if typeslist2:
-            if awd in typeslist2:
-                typeslist2.remove(awd)
+    neighbours_complete = False
+    if ratio_threshold > 0.0 and (neighbours is not None or not lazy):
+        # Search the neighbourhood of every type once. The grouping then only has to
+        # pick from the neighbours that have not been grouped yet.
+        with profiling.phase("neighbour search") as aphase:
+            neighbours = get_word_neighbours(typeslist, ratio_threshold, neighbours=neighbours, jobs=jobs)
+            aphase.count = len(neighbours)
+        neighbours_complete = True
+    elif ratio_threshold > 0.0:
+        # The neighbourhoods are searched as the grouping reaches their types.
+        neighbours = dict(searched_neighbours) if searched_neighbours else None
+
+    prioritised_list = PrioritisedList(vocab, combined_list, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold, neighbours=neighbours, neighbours_complete=neighbours_complete)
+    if not lazy:
+        with profiling.phase("grouping") as aphase, profiling.profile_code("grouping"):
+            prioritised_list.group_all(progress=True)
+            aphase.count = len(prioritised_list.word_sets)
+
+    return prioritised_list, vocab, prioritised_list.neighbours
+
+
+class PrioritisedList:
+    """
+    The prioritised list of word sets, where every word set is a list of type IDs.
+    The types are taken in priority order and each one is grouped with its closest
+    matches among the types that have not been grouped yet. The list is grouped
+    lazily: indexing it groups the word sets up to the index, and a background
+    thread can extend it ahead of the annotator. Since the grouping state is kept
+    between calls, the word sets are the same as those of a complete pass.
+    len() groups the whole list; use estimate_length() to avoid that.
+    """
+    def __init__(self, vocab, order, num_alternatives=None, ratio_threshold=0.0, neighbours=None, neighbours_complete=False, word_sets=None):
+        self.vocab = vocab
+        # The type IDs in priority order.
+        self.order = order
+        self.num_alternatives = num_alternatives
+        self.ratio_threshold = ratio_threshold
+        # Guards the grouping state, which the background thread extends.
+        self.lock = threading.RLock()
+
+        self.word_sets = list(word_sets) if word_sets is not None else []
+        self.is_complete = word_sets is not None
+        # Flag the types that have been grouped already, and the position in order of the next type to group.
+        self.grouped = bytearray(len(vocab))
+        self.num_grouped = 0
+        self.position = 0
+
+        # The neighbourhoods of the types, when ratio_threshold is above zero. Missing ones are
+        # searched when their type is reached, with a similarity index that is built on first use.
+        if ratio_threshold > 0.0:
+            self.neighbours = neighbours if neighbours is not None else {}
+        else:
+            self.neighbours = None
+        self.neighbours_complete = neighbours_complete
+        self.simindex = None
+        # The exhaustive search at ratio_threshold zero takes the ungrouped types as a set of words.
+        self.alive = None
+
+        self.extender = None
+        self.stop_requested = False
+
+    def mark_grouped(self, wid):
+        self.grouped[wid] = 1
+        self.num_grouped += 1
+        if self.alive is not None:
+            self.alive.discard(self.vocab.words[wid])
+
+    def get_matches(self, awd):
+        """
+        Return the closest matches of a type among the types that have not been grouped yet.
+        """
+        if self.neighbours is None:
+            if self.simindex is None:
+                self.simindex = SimilarityIndex(self.vocab.words, ratio_threshold=self.ratio_threshold)
+                self.alive = set([bwd for bid, bwd in enumerate(self.vocab.words) if not self.grouped[bid]])
+            return self.simindex.find_matches(awd, num_alternatives=self.num_alternatives, ratio_threshold=self.ratio_threshold, alive=self.alive)
+
+        word_ids = self.vocab.ids
+        return select_alternatives([amatch for amatch in self.get_neighbourhood(awd) if not self.grouped[word_ids[amatch[0]]]], num_alternatives=self.num_alternatives, ratio_threshold=self.ratio_threshold)
+
+    def get_neighbourhood(self, awd):
+        """
+        Return the neighbourhood of a type, searching it if it is not known yet.
+        """
+        neighbourhood = self.neighbours.get(awd)
+        if neighbourhood is None:
+            if self.simindex is None:
+                self.simindex = SimilarityIndex(self.vocab.words, ratio_threshold=self.ratio_threshold)
+            neighbourhood = [amatch for amatch in self.simindex.threshold_matches(awd, self.ratio_threshold) if amatch[0] != awd]
+            self.neighbours[awd] = neighbourhood
+        return neighbourhood
+
+    def group_next(self):
+        """
+        Group the next word set. Returns False if the list is complete.
+        """
+        with self.lock:
+            word_ids = self.vocab.ids
+            while not self.is_complete and self.position < len(self.order) and self.num_grouped < len(self.vocab):
+                wid = self.order[self.position]
+                self.position += 1
+                if self.grouped[wid]:
+                    continue
+                self.mark_grouped(wid)
                 wordset = []
-                matches = find_matches_faster(awd, typeslist2, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
-                for amatch in matches:
-                    if amatch[0] in typeslist2:
-                        typeslist2.remove(amatch[0])
-                        wordset.append((len_dict[amatch[0]], amatch[0], counts_dict[amatch[0]], len_dict[amatch[0]] + counts_dict[amatch[0]]))
+                for amatch in self.get_matches(self.vocab.words[wid]):
+                    bid = word_ids[amatch[0]]
+                    if not self.grouped[bid]:
+                        self.mark_grouped(bid)
+                        wordset.append(bid)
                 # Add the word from the outer foor loop too.
-                wordset.append((alen, awd, count_val, priority_val))
-                combined_list2.append(wordset)
+                wordset.append(wid)
+                self.word_sets.append(wordset)
+                return True
+            self.is_complete = True
+            return False
+
+    def extend_to(self, idx):
+        """
+        Group the word sets up to and including the one at index idx, as far as there are any.
+        """
+        with self.lock:
+            while len(self.word_sets) <= idx and self.group_next():
+                pass
+
+    def group_all(self, progress=False):
+        with self.lock:
+            with tqdm(total=len(self.order), initial=self.position, disable=not progress) as pbar:
+                while True:
+                    position = self.position
+                    if not self.group_next():
+                        break
+                    pbar.update(self.position - position)
+
+    def has_word_set(self, idx):
+        """
+        Return True if there is a word set at index idx, grouping up to it if need be.
+        """
+        if idx < 0:
+            return False
+        with self.lock:
+            self.extend_to(idx)
+            return idx < len(self.word_sets)
+
+    def estimate_length(self):
+        """
+        Return the number of word sets, or while the grouping is not complete, an estimate
+        from the number of types per word set so far.
+        """
+        with self.lock:
+            if self.is_complete:
+                return len(self.word_sets)
+            if self.num_grouped == 0:
+                return len(self.vocab)
+            return max(len(self.word_sets), round(len(self.word_sets) * len(self.vocab) / self.num_grouped))
+
+    def __getitem__(self, idx):
+        with self.lock:
+            if isinstance(idx, slice):
+                if idx.stop is None or idx.stop < 0 or (idx.start is not None and idx.start < 0):
+                    self.group_all()
+                else:
+                    self.extend_to(idx.stop - 1)
+            elif idx < 0:
+                self.group_all()
+            else:
+                self.extend_to(idx)
+            return self.word_sets[idx]
+
+    def __len__(self):
+        self.group_all()
+        return len(self.word_sets)
+
+    def __iter__(self):
+        aidx = 0
+        while self.has_word_set(aidx):
+            yield self.word_sets[aidx]
+            aidx += 1
+
+    def fill_neighbours(self):
+        """
+        Search the neighbourhoods of the types that the grouping did not need, so that
+        the neighbourhoods can be reused when the vocabulary changes. This runs in the
+        background thread and stops early when stop() is called.
+        Returns True if all the neighbourhoods are known.
+        """
+        if self.neighbours is None or self.neighbours_complete:
+            return True
+        for awd in self.vocab.words:
+            if self.stop_requested:
+                return False
+            with self.lock:
+                if awd not in self.neighbours:
+                    self.get_neighbourhood(awd)
+        self.neighbours_complete = True
+        return True
+
+    def search_neighbours(self, jobs):
+        """
+        Search the neighbourhoods that are not known yet with a pool of jobs worker
+        processes, while the grouping keeps searching the ones that it needs itself.
+        The neighbourhoods of every chunk are added as it completes. This runs in the
+        background thread and stops early when stop() is called.
+        Returns True if all the neighbourhoods are known.
+        """
+        with self.lock:
+            search_types = [awd for awd in self.vocab.words if awd not in self.neighbours]
+        if search_types:
+            # Small chunks, so that stop() does not wait long for the chunks that are being searched.
+            types_chunks = split_into_chunks(search_types, jobs, chunks_per_worker=64)
+            # This runs in the background thread, so the workers are not forked from this process.
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=get_worker_context(), initializer=init_neighbour_worker,
+                                                              initargs=(self.vocab.words, self.ratio_threshold))
+            pending = {}
+            try:
+                pending = {executor.submit(find_neighbour_chunk, types_chunk, self.ratio_threshold): types_chunk for types_chunk in types_chunks}
+                while pending:
+                    if self.stop_requested:
+                        return False
+                    done, _ = concurrent.futures.wait(pending, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        types_chunk = pending.pop(future)
+                        with self.lock:
+                            for awd, neighbourhood in zip(types_chunk, future.result()):
+                                self.neighbours.setdefault(awd, neighbourhood)
+            finally:
+                # Drop the chunks that have not started, so that the shutdown only waits for the running ones.
+                for future in pending:
+                    future.cancel()
+                executor.shutdown(wait=True)
+        self.neighbours_complete = True
+        return True
+
+    def start_extending(self, on_complete=None, batch_seconds=0.05, jobs=1):
+        """
+        Extend the list in a background thread until it is complete, then call on_complete.
+        The thread groups the word sets in short batches, so that the main thread gets
+        the lock quickly when it needs a word set. With jobs > 1 the thread first searches
+        the remaining neighbourhoods with a pool of worker processes.
+        """
+        def extend():
+            if jobs > 1 and self.neighbours is not None and not self.neighbours_complete:
+                with profiling.phase("background neighbour search") as aphase:
+                    self.search_neighbours(jobs)
+                    aphase.count = len(self.neighbours)
+            with profiling.phase("background grouping") as aphase, profiling.profile_code("grouping"):
+                while not self.stop_requested:
+                    with self.lock:
+                        deadline = time.perf_counter() + batch_seconds
+                        while time.perf_counter() < deadline and self.group_next():
+                            pass
+                        if self.is_complete:
+                            break
+                    # Let a waiting main thread take the lock.
+                    time.sleep(0.001)
+                aphase.count = len(self.word_sets)
+            if self.is_complete and not self.stop_requested and on_complete is not None:
+                on_complete()
+
+        self.extender = threading.Thread(target=extend, name="prioritised_list", daemon=True)
+        self.extender.start()
+
+    def stop(self):
+        """
+        Stop the background thread and wait for it.
+        """
+        self.stop_requested = True
+        if self.extender is not None:
+            self.extender.join()
 
-    return combined_list2, typeslist, counts_dict
+
+def prepare_corpus(inputtext, mandatory_wordlist=None, num_alternatives=None, ratio_threshold=0.0, jobs=1, snapshot_dir=None, lazy=False):
+    """
+    Parse all the input files, count the tokens and build the prioritised list of word sets.
+    If a snapshot directory is given, the snapshot for the same settings is loaded instead.
+    When some input files changed since the snapshot was saved, only those files are parsed
+    again, their token counts are updated and only the neighbourhoods of new word types are
+    searched before the word sets are regrouped. The snapshot is saved whenever it changed.
+    With lazy=True the word sets are grouped on demand and by a background thread, so that
+    the first ones are available at once. With jobs > 1 the background thread searches the
+    neighbourhoods that the grouping has not reached yet with a pool of worker processes.
+    The snapshot is then saved again, with the word sets and all the neighbourhoods, when
+    the grouping completes, unless the occurrence index changed in the meantime. A snapshot
+    of an incomplete grouping resumes it.
+    Returns the PrioritisedList, the TypeVocabulary and the counts dictionary.
+    """
+    snapshot_settings = {
+        "informat": inputtext.informat,
+        "mandatory_wordlist": tuple(mandatory_wordlist or ()),
+        "num_alternatives": num_alternatives,
+        "ratio_threshold": ratio_threshold,
+    }
+    keep_token = get_token_filter()
+
+    snapshot = None
+    if snapshot_dir:
+        snapshot_fn = get_snapshot_fn(snapshot_dir, inputtext.directory, inputtext.informat)
+        with profiling.phase("snapshot load"):
+            snapshot = load_snapshot(snapshot_fn, get_snapshot_key(snapshot_settings))
+
+    if snapshot is not None:
+        log_and_print("Loaded the prepared corpus from the snapshot {}".format(snapshot_fn))
+        inputtext.occurrences = snapshot["occurrences"]
+        inputtext.file_names = snapshot["file_names"]
+        inputtext.file_ids = {afn: fid for fid, afn in enumerate(inputtext.file_names)}
+        inputtext.file_stamps = snapshot["file_stamps"]
+        inputtext.file_counts = snapshot["file_counts"]
+        vocab = snapshot["vocab"]
+        counts_dict = snapshot["counts_dict"]
+        neighbours = snapshot["neighbours"]
+        neighbours_complete = snapshot["neighbours_complete"]
+        prioritised_list = None
+        if snapshot["prioritised_list"] is not None:
+            prioritised_list = PrioritisedList(vocab, None, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold, neighbours=neighbours, neighbours_complete=neighbours_complete, word_sets=snapshot["prioritised_list"])
+
+        with profiling.phase("index refresh") as aphase:
+            file_changes = inputtext.refresh_occurrence_index(jobs=jobs)
+            aphase.count = len(file_changes)
+        if not file_changes and prioritised_list is not None:
+            return prioritised_list, vocab, counts_dict
+
+        counts_changed = False
+        if file_changes:
+            log_and_print("{} input files were added, removed or modified since the snapshot was saved.".format(len(file_changes)))
+            counts_changed = update_token_counts(counts_dict, file_changes, keep_token)
+        if counts_changed and neighbours_complete:
+            log_and_print("Regrouping the word types for the changed counts.")
+            prioritised_list, vocab, neighbours = prioritise_word_types(counts_dict, mandatory_wordlist=mandatory_wordlist, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold, neighbours=neighbours, jobs=jobs, lazy=lazy)
+        elif counts_changed or prioritised_list is None:
+            # The neighbourhoods of an incomplete grouping only serve the same vocabulary.
+            log_and_print("Resuming the grouping of the word types." if not counts_changed else "Regrouping the word types for the changed counts.")
+            prioritised_list, vocab, neighbours = prioritise_word_types(counts_dict, mandatory_wordlist=mandatory_wordlist, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold, jobs=jobs, lazy=lazy,
+                                                                        searched_neighbours=neighbours if not counts_changed else None)
+
+    else:
+        # Stream the corpus through the occurrence index, which keeps the word counts of each
+        # file, rather than holding all of the text and all of the tokens in memory.
+        with profiling.phase("index files") as aphase:
+            inputtext.index_all(jobs=jobs)
+            aphase.count = len(inputtext.file_stamps)
+
+        log_and_print("Prioritising word types.")
+        log_and_print("Calculating occurrence counts.")
+        with profiling.phase("count tokens") as aphase:
+            counts_dict = get_token_counts(count_file_tokens(inputtext.file_counts.values(), keep_token=keep_token))
+            aphase.count = len(counts_dict)
+        prioritised_list, vocab, neighbours = prioritise_word_types(counts_dict, mandatory_wordlist=mandatory_wordlist, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold, jobs=jobs, lazy=lazy)
+
+    if snapshot_dir:
+        index_version = inputtext.index_version
+
+        def save_prepared_corpus():
+            with prioritised_list.lock, inputtext.lock:
+                if inputtext.index_version != index_version:
+                    logging.info("The snapshot was not saved, since input files changed after the corpus was prepared.")
+                    return
+                logging.info("Saving a snapshot of the prepared corpus to {}".format(snapshot_fn))
+                with profiling.phase("snapshot save"):
+                    save_snapshot(snapshot_fn, get_snapshot_key(snapshot_settings), {
+                        "prioritised_list": prioritised_list.word_sets if prioritised_list.is_complete else None,
+                        "vocab": vocab,
+                        "counts_dict": counts_dict,
+                        "neighbours": prioritised_list.neighbours,
+                        "neighbours_complete": prioritised_list.neighbours_complete,
+                        "occurrences": inputtext.occurrences,
+                        "file_names": inputtext.file_names,
+                        "file_stamps": inputtext.file_stamps,
+                        "file_counts": inputtext.file_counts,
+                        })
+
+        def complete_snapshot():
+            if prioritised_list.fill_neighbours():
+                save_prepared_corpus()
+
+        print("Saving a snapshot of the prepared corpus to {}".format(snapshot_fn))
+        save_prepared_corpus()
+        if not prioritised_list.is_complete:
+            prioritised_list.start_extending(on_complete=complete_snapshot, jobs=jobs)
+    elif not prioritised_list.is_complete:
+        prioritised_list.start_extending(jobs=jobs)
+
+    return prioritised_list, vocab, counts_dict
 
 
 def set_coloured_word(astr, awrd, colorama_colour, instance=0):
@@ -347,16 +1204,20 @@ def set_coloured_word(astr, awrd, colorama_colour, instance=0):
     return " ".join(newstr)
 
 
-def print_main_prompt(wordset_list, wordset_idx, num_word_sets):
+def print_main_prompt(wordset_list, wordset_idx, num_word_sets, is_estimate=False):
     """
     Print the main menu and wait for a response.
+    The number of word sets is only an estimate while they are still being grouped.
     Return the value of the response.
     """
 
     print("\n=========================================================================================================")
     print("    WORD SET PAGES")
     print("=========================================================================================================\n")
-    print("Word set", wordset_idx, "of", num_word_sets,"\n")
+    if is_estimate:
+        print("Word set", wordset_idx, "of about", num_word_sets, "(still grouping)\n")
+    else:
+        print("Word set", wordset_idx, "of", num_word_sets,"\n")
     astr = "Which word do you wish to work on?\n"
     for tcount, atup in enumerate(wordset_list):
         #if tcount >= start_idx and tcount < end_idx:
@@ -399,14 +1260,27 @@ def handle_digits(invalue, limhi, limlo=0, action_fc=None):
     return retcode
 
 
-def handle_wordtype(awd, inputtext, typeslist, counts_dict, num_alternatives=None, ratio_threshold=0.0):
+def handle_wordtype(awd, inputtext, typeslist, counts_dict, num_alternatives=None, ratio_threshold=0.0, simindex=None, journal=None, prefetcher=None):
     """
     """
 
-    matches = find_matches_faster(awd, typeslist, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
+    with profiling.phase("match lookup") as aphase:
+        if prefetcher is not None:
+            # The prefetcher was set up with the same search settings.
+            matches = prefetcher.get_matches(awd)
+        elif simindex is not None:
+            matches = simindex.find_matches(awd, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
+        else:
+            matches = find_matches_faster(awd, typeslist, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
+        aphase.count = len(matches)
 
     log_and_print("Building the worklist.")
-    worklist = inputtext.build_worklist(awd)
+    with profiling.phase("worklist build") as aphase:
+        if prefetcher is not None:
+            worklist = prefetcher.get_worklist(awd)
+        else:
+            worklist = inputtext.build_worklist(awd)
+        aphase.count = len(worklist)
     num_occs = len(worklist)
 
     worklist_idx = 0
@@ -414,7 +1288,15 @@ def handle_wordtype(awd, inputtext, typeslist, counts_dict, num_alternatives=Non
         # Unpack the items in the worklist
         occ_progress_count, atgfn, interval_count, instance_count = worklist[worklist_idx]
 
-        tg_words = inputtext.get_sentence_at(atgfn, interval_count)
+        with profiling.phase("sentence fetch"):
+            tg_words = inputtext.get_sentence_at(atgfn, interval_count)
+        if tg_words is None:
+            # The file was changed since the worklist was built and the interval is gone.
+            log_and_print("Interval {} of {} no longer exists. Skipping it.".format(interval_count+1, atgfn))
+            del worklist[worklist_idx]
+            if worklist_idx >= len(worklist):
+                print("The end of the work list for \"{}\" has been reached.".format(awd))
+            continue
         print("\n=========================================================================================================")
         print("    CORRECTION CHOICES")
         print("=========================================================================================================\n")
@@ -446,6 +1328,8 @@ def handle_wordtype(awd, inputtext, typeslist, counts_dict, num_alternatives=Non
                         worklist[worklist_idx][2]+1,
                         worklist[worklist_idx][3]+1,
                         matches[int(response)][0]))
+                    if journal is not None:
+                        journal.change(awd, worklist[worklist_idx][1], worklist[worklist_idx][2]+1, worklist[worklist_idx][3]+1, matches[int(response)][0])
 
                 else:
                     # Not a valid number. Retry.
@@ -471,6 +1355,8 @@ def handle_wordtype(awd, inputtext, typeslist, counts_dict, num_alternatives=Non
                 worklist[worklist_idx][2]+1,
                 worklist[worklist_idx][3]+1,
                 response))
+            if journal is not None:
+                journal.change(awd, worklist[worklist_idx][1], worklist[worklist_idx][2]+1, worklist[worklist_idx][3]+1, response)
             matches.append((response, 0.0))
             worklist_idx += 1
         elif response == "a":
@@ -479,6 +1365,8 @@ def handle_wordtype(awd, inputtext, typeslist, counts_dict, num_alternatives=Non
             log_and_print("Globally change {} to {} in all the transcriptions.".format(
                 awd,
                 matches[int(response)][0]))
+            if journal is not None:
+                journal.global_change(awd, matches[int(response)][0])
             worklist_idx = len(worklist)
         elif response == "b":
             # Step back by decrementing the worklist index
@@ -493,6 +1381,8 @@ def handle_wordtype(awd, inputtext, typeslist, counts_dict, num_alternatives=Non
                 worklist[worklist_idx][2]+1,
                 worklist[worklist_idx][3]+1,
                 response))
+            if journal is not None:
+                journal.note(awd, worklist[worklist_idx][1], worklist[worklist_idx][2]+1, worklist[worklist_idx][3]+1, response)
             input("Press Enter to continue.")
             # Move on to the next item in the worklist.
             worklist_idx += 1
@@ -510,10 +1400,6 @@ def handle_wordtype(awd, inputtext, typeslist, counts_dict, num_alternatives=Non
 
 def main():
 
-    prioritised_list_ratio_threshold = 0.7
-    prioritised_list_max_alternatives = 2
-    ratio_threshold = 0.7
-    max_alternatives = 4
     mandatory_wordlist = None
 
     args = parse_command_line_arguments()
@@ -530,25 +1416,35 @@ def main():
         "format": "%(levelname)s:%(name)s:%(asctime)s:%(message)s"
         })
     logging.info("Starting Lokisa Spell.")
+    if args.profile:
+        profiling.enable(summary_fn=os.path.join(logdir, "profile_{}.json".format(datestr)),
+                         cprofile_fn_pattern=os.path.join(logdir, "profile_{}_{{}}.prof".format(datestr)) if args.profile_grouping else None)
+    # The decisions are also recorded in a structured journal for apply_log_changes.py.
+    journal = ChangeJournal(os.path.join(logdir, "journal_{}.jsonl".format(datestr)))
 
     log_and_print("\n\nFinding and parsing all TextGrid files in {}".format(args.input_text_dir))
 
-    it_if = InputText(directory=args.input_text_dir, informat=args.input_text_format)
-    text_all = it_if.get_text_all()
-
-    log_and_print("Extracting all word tokens.")
-    tokenlist = split_list(text_all)
-
     if args.mandatory_wordlist_fn:
-        # Load word from the mandatory word list file
-        with open(args.mandatory_wordlist_fn, "r") as fid:
-            mandatory_wordlist = [awd.strip() for awd in fid if not awd.startswith('#')]
-
-    log_and_print("Prioritising word types.")
-    prioritised_list, typeslist, counts_dict = get_prioritised_list(tokenlist, mandatory_wordlist=mandatory_wordlist, num_alternatives=prioritised_list_max_alternatives, ratio_threshold=prioritised_list_ratio_threshold)
+        mandatory_wordlist = read_mandatory_wordlist(args.mandatory_wordlist_fn)
+
+    it_if = InputText(directory=args.input_text_dir, informat=args.input_text_format, document_cache_bytes=args.document_cache_mb*1024*1024)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    snapshot_dir = None if args.no_snapshot else args.snapshot_dir
+    with profiling.phase("prepare corpus"):
+        prioritised_list, vocab, counts_dict = prepare_corpus(it_if, mandatory_wordlist=mandatory_wordlist, num_alternatives=PRIORITISED_LIST_MAX_ALTERNATIVES, ratio_threshold=PRIORITISED_LIST_RATIO_THRESHOLD, jobs=jobs, snapshot_dir=snapshot_dir, lazy=True)
+
+    # Build the similarity index once for all the interactive lookups. It serves every threshold at or above the one it is built for.
+    log_and_print("Indexing the vocabulary for lookups.")
+    typeslist = vocab.words
+    with profiling.phase("similarity index") as aphase:
+        simindex = SimilarityIndex(typeslist, ratio_threshold=min(RATIO_THRESHOLD, SEARCH_RATIO_THRESHOLD))
+        aphase.count = len(typeslist)
+
+    # Prepare the word sets that are likely to be opened next while the main menu waits for input.
+    prefetcher = None
+    if args.prefetch_word_sets >= 0:
+        prefetcher = WordSetPrefetcher(it_if, lambda awd: simindex.find_matches(awd, num_alternatives=MAX_ALTERNATIVES, ratio_threshold=RATIO_THRESHOLD))
 
-    #pprint(text_all)
-    #pprint(tokenlist)
     #pprint(counts_dict)
     #pprint(len_list)
     #pprint(prioritised_list)
@@ -558,9 +1454,12 @@ def main():
     wordset_idx = 0
     while True:
 
-        wordset_list = prioritised_list[wordset_idx]
+        with profiling.phase("word set page"):
+            wordset_list = vocab.entries(prioritised_list[wordset_idx])
+            if prefetcher is not None:
+                prefetcher.schedule([vocab.words[wid] for wordset in prioritised_list[wordset_idx:wordset_idx+1+args.prefetch_word_sets] for wid in wordset])
         
-        response = print_main_prompt(wordset_list, wordset_idx+1, len(prioritised_list))
+        response = print_main_prompt(wordset_list, wordset_idx+1, prioritised_list.estimate_length(), is_estimate=not prioritised_list.is_complete)
 
         if response.isdigit():
             retcode = handle_digits(response, len(wordset_list))
@@ -571,21 +1470,29 @@ def main():
                 awd = wordset_list[int(response)][1]
                 log_and_print("Let's work on \"{}\"".format(awd))
                 input("Press Enter to continue.")
-                handle_wordtype(awd, it_if, typeslist, counts_dict, num_alternatives=max_alternatives, ratio_threshold=ratio_threshold)
+                handle_wordtype(awd, it_if, typeslist, counts_dict, num_alternatives=MAX_ALTERNATIVES, ratio_threshold=RATIO_THRESHOLD, simindex=simindex, journal=journal, prefetcher=prefetcher)
+                journal.sync()
                 log_and_print("Going back to the main menu.")
                 input("Press Enter to continue.")
 
         elif response == "q":
+            if prefetcher is not None:
+                prefetcher.close()
+            prioritised_list.stop()
+            journal.close()
             break
 
         elif response == "j":
+            if prefetcher is not None:
+                # Stop preparing the word sets around the one that is left.
+                prefetcher.cancel()
             response = input("Enter the word set number: ")
             if not response.isdigit():
                 print(response, "is not a number. Please enter a number for option j.")
                 continue
 
             response = int(response) - 1
-            if (response < len(prioritised_list)) and (response >= 0):
+            if prioritised_list.has_word_set(response):
                 wordset_idx = response
             else:
                 print(response + 1, "is not valid. Please try again.")
@@ -594,11 +1501,12 @@ def main():
 
         elif response == "e":
             response = input("Enter a word to work on: ")
-            if response in typeslist:
+            if response in vocab:
                 awd = response
                 log_and_print("Let's work on \"{}\"".format(awd))
                 input("Press Enter to continue.")
-                handle_wordtype(awd, it_if, typeslist, counts_dict, num_alternatives=max_alternatives, ratio_threshold=ratio_threshold)
+                handle_wordtype(awd, it_if, typeslist, counts_dict, num_alternatives=MAX_ALTERNATIVES, ratio_threshold=RATIO_THRESHOLD, simindex=simindex, journal=journal, prefetcher=prefetcher)
+                journal.sync()
                 log_and_print("Going back to the main menu.")
                 input("Press Enter to continue.")
 
@@ -609,13 +1517,15 @@ def main():
 
         elif response == "s":
             response = input("Enter a word to search for: ")
-            if response in typeslist:
+            if response in vocab:
                 awd = response
                 print("\nThe word \"{}\" is found in the vocabulary. [Occurence count:{:5}]".format(awd, counts_dict[awd]))
                 input("\nPress Enter to continue.")
 
             else:
-                matches = find_matches_faster(response, typeslist, num_alternatives=2, ratio_threshold=0.6)
+                with profiling.phase("search lookup") as aphase:
+                    matches = simindex.find_matches(response, num_alternatives=SEARCH_MAX_ALTERNATIVES, ratio_threshold=SEARCH_RATIO_THRESHOLD)
+                    aphase.count = len(matches)
                 if not matches:
                     print("No close matching words were found. Please try again with a different spelling.")
                 else:
@@ -626,7 +1536,7 @@ def main():
                 continue
 
         elif response == "n":
-            if wordset_idx + 1 < len(prioritised_list):
+            if prioritised_list.has_word_set(wordset_idx + 1):
                 wordset_idx += 1
 
         elif response == "b":
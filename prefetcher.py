@@ -0,0 +1,176 @@
+"""
+Background preparation of the word sets that the annotator is likely to open next.
+
+While the main menu waits for input the program has nothing to do, and opening a
+word type then has to find its closest matches and build its worklist first. The
+WordSetPrefetcher uses that idle time: a background thread works through the word
+types of the current and the next few word sets, finds their matches, builds
+their worklists and reads the files of their first occurrences into the document
+cache of the InputText. Opening a word type then only has to pick up the results.
+
+The prefetcher works on one word type at a time. Scheduling new word types, e.g.
+after a jump to another word set, cancels the work that is still pending and drops
+the results for the word types that are no longer scheduled. A prefetched worklist
+is only used while the occurrence index is unchanged since it was built, which is
+checked after the index has been refreshed for any change of the input files.
+"""
+
+import logging
+import threading
+
+
+class WordSetPrefetcher:
+    """
+    Prefetch the matches, worklists and sentences of scheduled word types in a
+    background thread. find_matches is called with a word type and returns its list
+    of (word_label, Levenshtein_ratio) tuples.
+    """
+    def __init__(self, inputtext, find_matches, num_sentences=5):
+        self.inputtext = inputtext
+        self.find_matches = find_matches
+        # Number of occurrences per word type whose sentences are read ahead.
+        self.num_sentences = num_sentences
+
+        self.condition = threading.Condition()
+        # The word types still to prefetch, in order, and all the word types that are scheduled.
+        self.pending = []
+        self.wanted = set()
+        # The word type that the background thread is working on.
+        self.current = None
+        # Word type -> matches, and word type -> (index version, worklist).
+        self.matches = {}
+        self.worklists = {}
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.run, name="prefetcher", daemon=True)
+        self.thread.start()
+
+    def schedule(self, words):
+        """
+        Prefetch the given word types, in order, instead of the ones scheduled before.
+        """
+        with self.condition:
+            self.pending = list(words)
+            self.wanted = set(self.pending)
+            for awd in [awd for awd in self.matches if awd not in self.wanted]:
+                del self.matches[awd]
+            for awd in [awd for awd in self.worklists if awd not in self.wanted]:
+                del self.worklists[awd]
+            self.condition.notify_all()
+
+    def cancel(self):
+        """
+        Stop prefetching and drop the prefetched results. The background thread stops
+        at the next step of the word type that it is working on.
+        """
+        self.schedule([])
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.pending = []
+            self.condition.notify_all()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                awd = self.pending.pop(0)
+                self.current = awd
+            try:
+                self.prefetch_word(awd)
+            except Exception:
+                # The word type is prepared again when it is opened, which reports the error.
+                logging.exception("Prefetching \"{}\" failed.".format(awd))
+            finally:
+                with self.condition:
+                    self.current = None
+                    self.condition.notify_all()
+
+    def is_wanted(self, awd):
+        with self.condition:
+            return awd in self.wanted and not self.closed
+
+    def prefetch_word(self, awd):
+        """
+        Find the matches of a word type, build its worklist and read the sentences of
+        its first occurrences, unless the work is cancelled in between.
+        """
+        with self.condition:
+            have_matches = awd in self.matches
+        if not have_matches:
+            matches = self.find_matches(awd)
+            with self.condition:
+                if awd in self.wanted:
+                    self.matches[awd] = matches
+                    self.condition.notify_all()
+
+        if not self.is_wanted(awd):
+            return
+        with self.inputtext.lock:
+            # The index is refreshed first, so that a worklist from before a change of the files is rebuilt.
+            self.inputtext.refresh_occurrence_index()
+            with self.condition:
+                worklist = self.get_valid_worklist(awd)
+            if worklist is None:
+                worklist = self.inputtext.build_worklist(awd)
+                index_version = self.inputtext.index_version
+                with self.condition:
+                    if awd in self.wanted:
+                        self.worklists[awd] = (index_version, worklist)
+                        self.condition.notify_all()
+
+        for occ_cnt, afn, interval_count, instance_count in worklist[:self.num_sentences]:
+            if not self.is_wanted(awd):
+                return
+            self.inputtext.get_sentence_at(afn, interval_count)
+
+    def get_valid_worklist(self, awd):
+        entry = self.worklists.get(awd)
+        if entry is not None and entry[0] == self.inputtext.index_version:
+            return entry[1]
+        return None
+
+    def wait_for_current(self, awd):
+        """
+        Wait while the background thread is working on the word type, rather than
+        doing the same work twice.
+        """
+        with self.condition:
+            while self.current == awd and not self.closed:
+                self.condition.wait()
+
+    def get_matches(self, awd):
+        """
+        Return the matches of a word type, from the prefetched ones if possible.
+        The list is a copy that the caller may extend.
+        """
+        with self.condition:
+            matches = self.matches.get(awd)
+            if matches is None and self.current == awd:
+                # Usually the matches are ready well before the worklist is.
+                while awd not in self.matches and self.current == awd and not self.closed:
+                    self.condition.wait()
+                matches = self.matches.get(awd)
+        if matches is None:
+            matches = self.find_matches(awd)
+        return list(matches)
+
+    def get_worklist(self, awd):
+        """
+        Return the worklist of a word type, from the prefetched one if it is still valid.
+        The list is a copy that the caller may change.
+        """
+        self.wait_for_current(awd)
+        with self.inputtext.lock:
+            # The version only tells whether the worklist is current once the index is refreshed.
+            self.inputtext.refresh_occurrence_index()
+            with self.condition:
+                worklist = self.get_valid_worklist(awd)
+            if worklist is None:
+                worklist = self.inputtext.build_worklist(awd)
+        return list(worklist)
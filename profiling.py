@@ -0,0 +1,195 @@
+"""
+Opt-in timing of the phases of Lokisa Spell and of the interactive actions.
+
+The code marks its phases and actions with phase(), e.g.
+
+    with profiling.phase("count tokens") as aphase:
+        counts_dict = get_token_counts(tokens)
+        aphase.count = len(counts_dict)
+
+Until enable() is called, phase() does nothing. Once profiling is enabled,
+every phase is written to the session log with its wall time, CPU time, item
+count and the peak resident memory (RSS) of the process so far. The totals
+per phase are written to a JSON summary when the program exits. The CPU time
+is that of the whole process, so it includes the background threads but not
+the worker processes. profile_code() additionally saves a cProfile dump of a
+block of code, e.g. the grouping of the word sets.
+"""
+
+import atexit
+import contextlib
+import cProfile
+import json
+import logging
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the peak RSS is left out.
+    resource = None
+
+# Increase this when the layout of the summary changes.
+SUMMARY_VERSION = 1
+
+
+class PhaseRecord:
+    """
+    The measurements of one run of a phase. The code in the phase can set the count.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.count = None
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss_mb = None
+
+
+class NullRecord:
+    """
+    Stands in for a PhaseRecord while profiling is not enabled.
+    """
+    def __setattr__(self, name, value):
+        pass
+
+
+_null_record = NullRecord()
+
+# Whether profiling is enabled, the file names of the summary and of the cProfile dumps,
+# and the totals per phase name.
+_enabled = False
+_summary_fn = None
+_cprofile_fn_pattern = None
+_start_time = None
+_totals = {}
+_lock = threading.Lock()
+
+
+def get_peak_rss_mb():
+    """
+    Return the peak resident memory of the process in MB, or None if it is not known.
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes.
+    if sys.platform == "darwin":
+        return peak_rss / (1024 * 1024)
+    return peak_rss / 1024
+
+
+def enable(summary_fn=None, cprofile_fn_pattern=None):
+    """
+    Start recording the phases. The summary is written to summary_fn at exit.
+    cprofile_fn_pattern is a file name with a {} for the name of the profiled
+    code, for profile_code(). Without it no cProfile dumps are saved.
+    """
+    global _enabled, _summary_fn, _cprofile_fn_pattern, _start_time
+    _enabled = True
+    _summary_fn = summary_fn
+    _cprofile_fn_pattern = cprofile_fn_pattern
+    _start_time = time.perf_counter()
+    if summary_fn is not None:
+        atexit.register(write_summary)
+
+
+def is_enabled():
+    return _enabled
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Measure the code in the with block as a run of the named phase.
+    """
+    if not _enabled:
+        yield _null_record
+        return
+
+    record = PhaseRecord(name)
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        yield record
+    finally:
+        record.wall_time = time.perf_counter() - start_wall
+        record.cpu_time = time.process_time() - start_cpu
+        record.peak_rss_mb = get_peak_rss_mb()
+        add_record(record)
+
+
+def add_record(record):
+    """
+    Log a run of a phase and add it to the totals.
+    """
+    message = "Profile: {}: {:.4f} s wall, {:.4f} s CPU".format(record.name, record.wall_time, record.cpu_time)
+    if record.count is not None:
+        message += ", {} items".format(record.count)
+    if record.peak_rss_mb is not None:
+        message += ", peak RSS {:.1f} MB".format(record.peak_rss_mb)
+    logging.info(message)
+
+    with _lock:
+        totals = _totals.setdefault(record.name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_wall_s": 0.0, "count": None, "peak_rss_mb": None})
+        totals["calls"] += 1
+        totals["wall_s"] += record.wall_time
+        totals["cpu_s"] += record.cpu_time
+        totals["max_wall_s"] = max(totals["max_wall_s"], record.wall_time)
+        if record.count is not None:
+            totals["count"] = (totals["count"] or 0) + record.count
+        if record.peak_rss_mb is not None:
+            totals["peak_rss_mb"] = max(totals["peak_rss_mb"] or 0.0, record.peak_rss_mb)
+
+
+@contextlib.contextmanager
+def profile_code(name):
+    """
+    Save a cProfile dump of the code in the with block, if profiling is enabled
+    with a cProfile file name. Only the thread that runs the block is profiled.
+    """
+    if not _enabled or _cprofile_fn_pattern is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is active already, e.g. in another thread.
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        cprofile_fn = _cprofile_fn_pattern.format(name)
+        profiler.dump_stats(cprofile_fn)
+        logging.info("Profile: saved the cProfile dump of {} to {}".format(name, cprofile_fn))
+
+
+def get_summary():
+    """
+    Return the totals of every phase and the session time as a dictionary.
+    """
+    with _lock:
+        phases = {aname: dict(totals) for aname, totals in _totals.items()}
+    return {
+        "version": SUMMARY_VERSION,
+        "session_wall_s": time.perf_counter() - _start_time if _start_time is not None else None,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "phases": phases,
+    }
+
+
+def write_summary(summary_fn=None):
+    """
+    Write the summary to a JSON file, by default the one given to enable().
+    """
+    summary_fn = summary_fn or _summary_fn
+    if not _enabled or summary_fn is None:
+        return
+    with open(summary_fn, "w", encoding="utf-8") as fid:
+        json.dump(get_summary(), fid, indent=2)
+    logging.info("Profile: wrote the summary to {}".format(summary_fn))
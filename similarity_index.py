@@ -0,0 +1,237 @@
+"""
+Candidate generation for Levenshtein ratio searches.
+
+Lokisa compares word types with Levenshtein.ratio(), which equals
+2 * LCS / (len_a + len_b). Two words can therefore only reach a ratio
+threshold if they share enough characters. The SimilarityIndex below keeps
+an inverted index from characters to word types and uses it to shortlist
+the word types that could possibly reach the threshold. Only those are
+scored with Levenshtein.ratio().
+"""
+
+import itertools
+import math
+
+
+# Slack used when turning float ratio thresholds into integer bounds. The
+# bounds must never be tighter than the exact ratio comparison.
+_EPS = 1e-9
+
+
+def select_alternatives(match_ratios, num_alternatives=None, ratio_threshold=0.0):
+    """
+    Apply the selection rules of find_matches_faster to a list of
+    (word_label, Levenshtein_ratio) tuples that is already sorted from the
+    highest to the lowest ratio.
+    """
+    if not match_ratios:
+        return []
+
+    # Discard the first match which is the query word itself.
+    if match_ratios[0][1] == 1.0:
+        match_ratios = match_ratios[1:]
+
+    if ratio_threshold > 0.0:
+        match_ratios = [(awd, levrat) for awd, levrat in match_ratios if levrat >= ratio_threshold]
+
+    # Get the set of ratios
+    ratios_list = sorted(list(set([arat for awd, arat in match_ratios])), reverse=True)
+
+    # Pick from the highest ratios until we have the required number of alternatives
+    match_ratios_new = []
+
+    if num_alternatives:
+        if len(ratios_list) <= num_alternatives:
+            match_ratios_new = match_ratios
+        else:
+            ratio_cmp = ratios_list[num_alternatives-1]
+            for amatch in match_ratios:
+                if amatch[1] >= ratio_cmp:
+                    match_ratios_new.append(amatch)
+                else:
+                    break
+    else:
+        match_ratios_new = match_ratios
+
+    return match_ratios_new
+
+
+def length_window(alen, ratio_threshold):
+    """
+    Return the (shortest, longest) word lengths that can still reach the
+    ratio threshold when compared to a word of length alen.
+    """
+    if ratio_threshold <= 0.0:
+        return 0, math.inf
+    lo = math.ceil(alen * ratio_threshold / (2.0 - ratio_threshold) - _EPS)
+    hi = math.floor(alen * (2.0 - ratio_threshold) / ratio_threshold + _EPS)
+    return max(lo, 0), hi
+
+
+def min_overlap(alen, blen, ratio_threshold):
+    """
+    Return the minimum number of shared characters two words of the given
+    lengths need in order to reach the ratio threshold.
+    """
+    return math.ceil(ratio_threshold * (alen + blen) / 2.0 - _EPS)
+
+
+def char_elements(awd):
+    """
+    Turn a word into its set of characters, where repeated characters are
+    numbered, e.g. "kala" -> [("k", 1), ("a", 1), ("l", 1), ("a", 2)].
+    The overlap of two such sets is the size of their common character
+    multiset, which is an upper bound on the length of their LCS.
+    """
+    seen = {}
+    elements = []
+    for ach in awd:
+        seen[ach] = seen.get(ach, 0) + 1
+        elements.append((ach, seen[ach]))
+    return elements
+
+
+class SimilarityIndex:
+    """
+    An inverted index over the characters of a list of word types that
+    shortlists the candidates for a Levenshtein ratio search.
+
+    It uses prefix filtering: the characters of every word are ordered from
+    the rarest to the most common in the vocabulary. Two words that share at
+    least T characters must share one of their first (len - T + 1)
+    characters, so only those prefixes are indexed and probed. Postings are
+    bucketed by word length so that words outside the possible length window
+    are never touched.
+
+    The index is built for a minimum ratio threshold. Searches with a lower
+    threshold fall back to scoring the whole word list.
+    """
+    def __init__(self, wordlist, ratio_threshold=0.7):
+        # The word list order is used to break ties between equal ratios.
+        self.wordlist = list(wordlist)
+        self.word_rank = {awd: aidx for aidx, awd in enumerate(self.wordlist)}
+        self.ratio_threshold = ratio_threshold
+        # Built on the first search that has to score the whole word list.
+        self.batch_scorer = None
+
+        # Global order of the character elements, rarest first.
+        element_counts = {}
+        for awd in self.wordlist:
+            for aelem in char_elements(awd):
+                element_counts[aelem] = element_counts.get(aelem, 0) + 1
+        self.element_order = {aelem: aidx for aidx, aelem in enumerate(
+            sorted(element_counts, key=lambda xx: (element_counts[xx], xx)))}
+
+        # Inverted index: element -> word length -> prefix position -> list of word types.
+        self.postings = {}
+        if self.usable(ratio_threshold):
+            for awd in self.wordlist:
+                for apos, aelem in enumerate(self.prefix(awd)):
+                    by_position = self.postings.setdefault(aelem, {}).setdefault(len(awd), [])
+                    while len(by_position) <= apos:
+                        by_position.append([])
+                    by_position[apos].append(awd)
+
+    def usable(self, ratio_threshold):
+        """
+        Return True if searches at the given ratio threshold can be served
+        from the index.
+        """
+        return ratio_threshold > 0.0 and self.ratio_threshold > 0.0 and ratio_threshold >= self.ratio_threshold
+
+    def ordered_elements(self, awd):
+        """
+        Return the elements of a word from the rarest to the most common.
+        Elements that are not in the vocabulary sort first.
+        """
+        return sorted(char_elements(awd), key=lambda xx: (self.element_order.get(xx, -1), xx))
+
+    def prefix(self, awd):
+        """
+        Return the elements of a word that are indexed. The prefix is long
+        enough for the shortest partner the word can have.
+        """
+        alen = len(awd)
+        lo, _ = length_window(alen, self.ratio_threshold)
+        overlap = max(min_overlap(alen, lo, self.ratio_threshold), 1)
+        return self.ordered_elements(awd)[:max(alen - overlap + 1, 0)]
+
+    def candidates(self, inword, ratio_threshold):
+        """
+        Return the set of word types that could reach the ratio threshold
+        against inword.
+        """
+        inlen = len(inword)
+        lo, hi = length_window(inlen, ratio_threshold)
+        found = set()
+        for apos, aelem in enumerate(self.ordered_elements(inword)):
+            by_length = self.postings.get(aelem)
+            if not by_length:
+                continue
+            for alen, by_position in by_length.items():
+                if alen < lo or alen > hi:
+                    continue
+                # Both words must share an element within their prefixes for this pair of lengths.
+                overlap = max(min_overlap(inlen, alen, ratio_threshold), 1)
+                if apos > inlen - overlap:
+                    continue
+                for awords in by_position[:alen - overlap + 1]:
+                    found.update(awords)
+        return found
+
+    def find_matches(self, inword, num_alternatives=None, ratio_threshold=0.0, alive=None):
+        """
+        Same as find_matches_faster(inword, wordlist, ...) where wordlist is
+        the indexed word list, restricted to the words in the alive set when
+        one is given. Returns a list with tuples (word_label, Levenshtein_ratio).
+
+        Searches below the threshold of the index are first answered from the
+        index. When the matches above the index threshold already hold
+        num_alternatives distinct ratios, they contain every match that the
+        full search would pick. Only otherwise is the whole word list scored,
+        with batch_scoring when NumPy is installed.
+        """
+        if self.usable(ratio_threshold):
+            return select_alternatives(self.threshold_matches(inword, ratio_threshold, alive=alive),
+                                       num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
+
+        if num_alternatives and self.usable(self.ratio_threshold):
+            match_ratios = self.threshold_matches(inword, self.ratio_threshold, alive=alive)
+            ratios_set = set([arat for awd, arat in match_ratios])
+            if match_ratios and match_ratios[0][1] == 1.0:
+                ratios_set = set([arat for awd, arat in match_ratios[1:]])
+            if len(ratios_set) >= num_alternatives:
+                return select_alternatives(match_ratios, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
+
+        # Imported here since batch_scoring builds on the helpers of this module.
+        import batch_scoring
+        if batch_scoring.available():
+            if self.batch_scorer is None:
+                self.batch_scorer = batch_scoring.BatchScorer(self.wordlist)
+            return self.batch_scorer.find_matches(inword, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold, alive=alive)
+
+        import Levenshtein
+        if alive is None:
+            wordlist = self.wordlist
+        else:
+            wordlist = [awd for awd in self.wordlist if awd in alive]
+        match_ratios = sorted([(awd, Levenshtein.ratio(inword, awd)) for awd in wordlist], reverse=True, key=lambda xx: xx[1])
+
+        return select_alternatives(match_ratios, num_alternatives=num_alternatives, ratio_threshold=ratio_threshold)
+
+    def threshold_matches(self, inword, ratio_threshold, alive=None):
+        """
+        Score the candidates from the index and return the (word_label,
+        Levenshtein_ratio) tuples that reach the threshold, sorted from the
+        highest to the lowest ratio. Ties keep the word list order.
+        """
+        # Levenshtein is imported on first use to keep the start of the program fast.
+        import Levenshtein
+        found = self.candidates(inword, ratio_threshold)
+        if alive is not None:
+            found &= alive
+        found = list(found)
+        ratios = map(Levenshtein.ratio, itertools.repeat(inword, len(found)), found)
+        match_ratios = [(awd, levrat) for awd, levrat in zip(found, ratios) if levrat >= ratio_threshold]
+        match_ratios.sort(key=lambda xx: (-xx[1], self.word_rank[xx[0]]))
+        return match_ratios
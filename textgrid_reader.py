@@ -0,0 +1,157 @@
+"""
+A fast, read-only reader for the text in Praat TextGrid files.
+
+Lokisa Spell only needs the marks of one tier, but the textgrid package builds
+a full object graph of tiers, intervals and time points for every file. This
+reader scans the values in the file with a single regular expression and
+returns the marks of the requested tier, together with their position in the
+decoded text so that they can be rewritten in place.
+
+Both the long and the short ("ooTextFile short") text formats are read, in
+UTF-8 or UTF-16. In the long format the labels such as "xmin =" or
+"intervals [1]:" are skipped, so both formats reduce to the same sequence of
+values. Like the textgrid package, intervals that do not span any time are
+left out, so that interval indices agree with those of the textgrid package.
+"""
+
+import codecs
+import re
+from collections import namedtuple
+
+# Times are rounded to this many digits before intervals are compared,
+# as in the textgrid package.
+TIME_PRECISION = 5
+
+# A value is either a quoted string, where double quotes are escaped by doubling
+# them and newlines are allowed, a number or a flag such as <exists>. Numbers and
+# flags must be followed by white space, so that labels such as "intervals [1]:"
+# are skipped. Every alternative starts with a character from a small set, which
+# lets the regular expression engine skip over the labels quickly.
+_VALUE_RE = re.compile(r'"([^"]*(?:""[^"]*)*)"'
+                       r'|([-+\d.][-+\d.eE]*)(?!\S)'
+                       r'|(<\w+>)(?!\S)')
+
+# A mark of a tier: its text and the span of the quoted text (excluding the quotes) in the decoded file.
+TierItem = namedtuple("TierItem", ["mark", "start", "end"])
+
+
+class TextGridReadError(ValueError):
+    pass
+
+
+def detect_encoding(data):
+    """
+    Return the encoding of the raw bytes of a text file. A byte order mark
+    decides between UTF-8 and UTF-16. Without one, NUL bytes in the first
+    characters give away UTF-16 and otherwise UTF-8 is assumed.
+    The byte order mark is not removed by the returned codec. It stays in the
+    decoded text as U+FEFF, so that encoding the text again with the same codec
+    gives back the original bytes.
+    """
+    if data.startswith(codecs.BOM_UTF16_LE):
+        return "utf-16-le"
+    if data.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16-be"
+    if data.startswith(codecs.BOM_UTF8):
+        return "utf-8"
+    head = data[:64]
+    if head and b"\x00" in head:
+        # ASCII text in UTF-16 has a NUL byte either before or after each character.
+        if head[1:2] == b"\x00":
+            return "utf-16-le"
+        return "utf-16-be"
+    return "utf-8"
+
+
+def decode_textgrid(data, encoding=None):
+    """
+    Decode the raw bytes of a TextGrid file.
+    Returns the text and the encoding that was used.
+    """
+    if encoding is None:
+        encoding = detect_encoding(data)
+    return data.decode(encoding), encoding
+
+
+def read_textgrid(fn, encoding=None):
+    """
+    Read and decode a TextGrid file, detecting its encoding if none is given.
+    Returns the text and the encoding.
+    """
+    with open(fn, "rb") as fid:
+        return decode_textgrid(fid.read(), encoding=encoding)
+
+
+def _string_value(amatch):
+    if amatch.group(1) is None:
+        raise TextGridReadError("Expected a string at position {}.".format(amatch.start()))
+    return amatch.group(1).replace('""', '"')
+
+
+def _number_value(amatch):
+    try:
+        return float(amatch.group(2))
+    except (TypeError, ValueError):
+        raise TextGridReadError("Expected a number at position {}.".format(amatch.start()))
+
+
+def read_tier_items(text, tier_index=0):
+    """
+    Read the marks of a tier from the decoded text of a TextGrid file.
+    Returns a list of TierItem tuples, or an empty list if the file has no
+    such tier.
+    """
+    values = _VALUE_RE.finditer(text)
+    try:
+        file_type = _string_value(next(values))
+        if not file_type.startswith("ooTextFile"):
+            raise TextGridReadError("The file is not a Praat text file.")
+        if _string_value(next(values)) != "TextGrid":
+            raise TextGridReadError("The file is not a TextGrid.")
+
+        next(values)  # xmin
+        next(values)  # xmax
+        if next(values).group(3) != "<exists>":
+            return []
+        num_tiers = int(_number_value(next(values)))
+
+        for atier in range(min(tier_index + 1, num_tiers)):
+            is_interval_tier = _string_value(next(values)) == "IntervalTier"
+            next(values)  # name
+            next(values)  # xmin
+            next(values)  # xmax
+            num_items = int(_number_value(next(values)))
+
+            if atier < tier_index:
+                # Skip the items of the tiers before the one that is wanted.
+                for _ in range(num_items * (3 if is_interval_tier else 2)):
+                    next(values)
+                continue
+
+            items = []
+            for _ in range(num_items):
+                if is_interval_tier:
+                    xmin = _number_value(next(values))
+                    xmax = _number_value(next(values))
+                    amatch = next(values)
+                    if round(xmin, TIME_PRECISION) < round(xmax, TIME_PRECISION):
+                        items.append(TierItem(_string_value(amatch), amatch.start(1), amatch.end(1)))
+                else:
+                    next(values)  # time
+                    amatch = next(values)
+                    items.append(TierItem(_string_value(amatch), amatch.start(1), amatch.end(1)))
+            return items
+
+    except StopIteration:
+        raise TextGridReadError("Unexpected end of the TextGrid file.")
+
+    return []
+
+
+def read_tier_marks(fn, tier_index=0, encoding=None):
+    """
+    Read the marks of a tier of a TextGrid file.
+    Returns a list with the text of every interval or point.
+    """
+    text, _ = read_textgrid(fn, encoding=encoding)
+    return [aitem.mark for aitem in read_tier_items(text, tier_index=tier_index)]
@@ -0,0 +1,128 @@
+"""
+An interned vocabulary of the word types that Lokisa Spell works on.
+
+Every word type gets an integer ID, its position in the sorted types list,
+so that the word sets of the prioritised list can be stored as lists of IDs
+rather than as tuples of strings and numbers. The counts, lengths and
+priority scores of the types are kept in compact array columns indexed by
+the ID. Since the IDs follow the alphabetical order of the types, sorting
+IDs also sorts the words.
+
+CountVocabulary counts the word tokens. It behaves like the Vocabulary of
+nltk.lm, which was used for this before, but does not take the import of
+nltk, which slows down the start of the program considerably.
+"""
+
+import collections
+from array import array
+
+
+class TypeVocabulary:
+    """
+    Word types interned to integer IDs, with array columns for the count,
+    the length and the priority score of every type.
+    """
+    def __init__(self, typeslist=(), counts=()):
+        # ID -> word type and word type -> ID.
+        self.words = []
+        self.ids = {}
+        self.counts = array("l")
+        self.lengths = array("l")
+        self.priorities = array("l")
+        for awd, acount in zip(typeslist, counts):
+            self.add(awd, acount)
+
+    def add(self, awd, acount):
+        """
+        Intern a word type with its count. Returns the ID of the type.
+        """
+        wid = self.ids.get(awd)
+        if wid is None:
+            wid = len(self.words)
+            self.words.append(awd)
+            self.ids[awd] = wid
+            self.counts.append(acount)
+            self.lengths.append(len(awd))
+            # The priority score favours long and frequent words.
+            self.priorities.append(len(awd) + acount)
+        return wid
+
+    def get_id(self, awd, default=None):
+        return self.ids.get(awd, default)
+
+    def entry(self, wid):
+        """
+        Return the tuple (word_length, word_label, frequency_count, priority_score)
+        of a type, as shown in the word set pages.
+        """
+        return (self.lengths[wid], self.words[wid], self.counts[wid], self.priorities[wid])
+
+    def entries(self, wordset):
+        """
+        Return the tuples of a word set, i.e. a list of type IDs.
+        """
+        return [self.entry(wid) for wid in wordset]
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, awd):
+        return awd in self.ids
+
+
+class CountVocabulary:
+    """
+    The occurrence counts of the word types, with the same semantics as
+    nltk.lm.Vocabulary: a word type is in the vocabulary if its count is at
+    least unk_cutoff, the count of an unknown word type is 0 and looking up
+    the unk_label returns the cutoff. Iterating gives the word types in the
+    vocabulary, followed by the unk_label if any word was counted.
+    """
+    def __init__(self, counts=None, unk_cutoff=1, unk_label="<UNK>"):
+        if unk_cutoff < 1:
+            raise ValueError("Cutoff value cannot be less than 1. Got: {}".format(unk_cutoff))
+        self.unk_label = unk_label
+        self._cutoff = unk_cutoff
+        # The counts may be given as any iterable of word tokens, or as a Counter of them.
+        self.counts = collections.Counter()
+        self._len = 0
+        self.update(counts if counts is not None else ())
+
+    @property
+    def cutoff(self):
+        return self._cutoff
+
+    def update(self, *counter_args, **counter_kwargs):
+        """
+        Add tokens to the counts, like Counter.update(), and recalculate the size of
+        the vocabulary. Call it without arguments after changing the counts directly.
+        """
+        self.counts.update(*counter_args, **counter_kwargs)
+        self._len = sum(1 for _ in self)
+
+    def __getitem__(self, item):
+        return self._cutoff if item == self.unk_label else self.counts[item]
+
+    def __contains__(self, item):
+        return self[item] >= self._cutoff
+
+    def __iter__(self):
+        cutoff = self._cutoff
+        for awd, acount in self.counts.items():
+            # Like the lookup of the unk_label, a counted unk_label is always in the vocabulary.
+            if acount >= cutoff or awd == self.unk_label:
+                yield awd
+        if self.counts:
+            yield self.unk_label
+
+    def __len__(self):
+        return self._len
+
+    def __eq__(self, other):
+        return (self.unk_label == other.unk_label
+                and self.cutoff == other.cutoff
+                and self.counts == other.counts)
+
+    def __str__(self):
+        return "<{} with cutoff={} unk_label='{}' and {} items>".format(
+            self.__class__.__name__, self.cutoff, self.unk_label, len(self))
@@ -0,0 +1,28 @@
+"""
+Splitting work into chunks for a pool of worker processes, and starting the pool.
+"""
+
+import math
+import multiprocessing
+
+
+def split_into_chunks(items, jobs, chunks_per_worker=4):
+    """
+    Split a list of items into chunks for a pool of jobs worker processes. A few
+    chunks per worker keeps the workers busy without too much pickling overhead.
+    Returns a list of lists that hold the items in their order.
+    """
+    chunk_size = max(1, math.ceil(len(items) / (jobs * chunks_per_worker)))
+    return [items[aidx:aidx + chunk_size] for aidx in range(0, len(items), chunk_size)]
+
+
+def get_worker_context():
+    """
+    Return the multiprocessing context for a pool that is started while other threads
+    are running. A forked worker would inherit the locks of the other threads in
+    whatever state they are in, so the workers are started from a fork server where
+    there is one, and spawned otherwise.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")